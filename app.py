@@ -1,6 +1,6 @@
 # /app.py
 
-from flask import Flask, session, redirect, url_for, render_template
+from flask import Flask, session, redirect, url_for, render_template, g
 from dotenv import load_dotenv
 import os
 import locale
@@ -11,6 +11,9 @@ load_dotenv()
 # Importa el módulo de configuración para inicializar Firebase al arrancar.
 import firebase_config
 
+from services.cache import category_cache
+from services.money import MINOR_DIGITS, format_minor, from_minor
+
 # Importa los blueprints que contienen las rutas de la aplicación.
 from blueprints.auth import auth_bp
 from blueprints.main import main_bp
@@ -37,13 +40,34 @@ except locale.Error:
         pass
 
 # Registra un filtro de plantilla personalizado para formatear números como moneda.
+# Los montos llegan en unidades menores (centavos), ver services/money.py.
 @app.template_filter('number_format')
 def number_format(value):
     try:
-        return "{:,.2f}".format(float(value))
+        return format_minor(float(value))
+    except (ValueError, TypeError):
+        return value
+
+# Monto en unidades mayores sin separadores, para el 'value' de un <input type="number">.
+@app.template_filter('major_units')
+def major_units(value):
+    try:
+        return "{:.{digits}f}".format(from_minor(float(value)), digits=MINOR_DIGITS)
     except (ValueError, TypeError):
         return value
 
+# En modo debug exponemos cuántas llamadas a Firestore hizo cada petición
+# (ver services/repository.py) para vigilar el presupuesto de lecturas.
+@app.after_request
+def firestore_usage_headers(response):
+    repo = g.get('repo')
+    if app.debug and repo is not None:
+        response.headers['X-Firestore-Reads'] = str(repo.reads)
+        response.headers['X-Firestore-Writes'] = str(repo.writes)
+        cache_stats = category_cache.stats()
+        response.headers['X-Category-Cache'] = f"hits={cache_stats['hits']} misses={cache_stats['misses']} size={cache_stats['size']}"
+    return response
+
 # --- REGISTRO DE BLUEPRINTS ---
 
 app.register_blueprint(auth_bp, url_prefix='/auth')
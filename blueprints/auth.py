@@ -2,8 +2,8 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from functools import wraps
-from firebase_config import db, firebase_auth
-from firebase_admin import firestore
+from firebase_config import firebase_auth
+from services.repository import UserRepository, ONBOARDING_SESSION_KEY
 
 auth_bp = Blueprint('auth', __name__, template_folder='../templates')
 
@@ -19,20 +19,10 @@ def login_required(f):
 
 # --- FUNCIÓN AUXILIAR (con cambios) ---
 def check_and_create_user_data(user_id, email):
-    user_ref = db.collection('users').document(user_id)
-    if not user_ref.get().exists:
-        # CAMBIO 1: Añadimos el campo 'currency' al crear el usuario.
-        user_ref.set({
-            'email': email, 
-            'created_at': firestore.SERVER_TIMESTAMP, 
-            'onboarding_complete': False,
-            'currency': 'USD' # Usamos USD como un valor por defecto seguro.
-        })
-        categories_ref = user_ref.collection('categories')
-        categories_ref.add({'name': 'Necesidades', 'budget_percent': 50, 'color': '#3b82f6'})
-        categories_ref.add({'name': 'Deseos', 'budget_percent': 30, 'color': '#8b5cf6'})
-        categories_ref.add({'name': 'Ahorro e Inversión', 'budget_percent': 20, 'color': '#10b981'})
-        user_ref.collection('savings').document('emergency_fund').set({'goal': 0, 'current': 0})
+    # Aún no hay sesión, así que creamos el repositorio directamente con el uid
+    repo = UserRepository(user_id)
+    if not repo.get_user():
+        repo.create_user(email)
         return True
     return False
 
@@ -88,5 +78,6 @@ def session_login():
 @login_required
 def logout():
     session.pop('user', None)
+    session.pop(ONBOARDING_SESSION_KEY, None)
     flash('Has cerrado sesión.', 'success')
     return redirect(url_for('index'))
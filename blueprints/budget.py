@@ -1,8 +1,14 @@
 # /blueprints/budget.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import (Blueprint, render_template, request, redirect, url_for, flash,
+                   Response, stream_template, stream_with_context)
 from datetime import datetime
-from firebase_config import db
+import csv
+import io
+from services.repository import get_repo
+from services.loader import load_parallel
+from services.money import MINOR_DIGITS, from_minor, to_minor
+from services.budgeting import build_matrix, report_rows
 from .auth import login_required
 
 budget_bp = Blueprint('budget', __name__, template_folder='../templates')
@@ -10,10 +16,9 @@ budget_bp = Blueprint('budget', __name__, template_folder='../templates')
 @budget_bp.route('/planner', methods=['GET', 'POST'])
 @login_required
 def planner():
-    user_id = session['user']
+    repo = get_repo()
     now = datetime.now()
     month_key = now.strftime('%Y-%m')
-    user_ref = db.collection('users').document(user_id)
     
     # --- LÓGICA POST: GUARDAR EL PRESUPUESTO DETALLADO ---
     if request.method == 'POST':
@@ -21,8 +26,8 @@ def planner():
             budget_data = {}
             total_budgeted_global = 0
             
-            cats_docs = user_ref.collection('categories').stream()
-            cat_ids = [doc.id for doc in cats_docs]
+            cat_ids = [cat['id'] for cat in repo.list_categories()]
+            currency = repo.currency()
 
             for cat_id in cat_ids:
                 descriptions = request.form.getlist(f'desc_{cat_id}[]')
@@ -34,7 +39,7 @@ def planner():
                 for desc, amt in zip(descriptions, amounts):
                     if desc.strip() and amt.strip(): 
                         try:
-                            val = float(amt)
+                            val = to_minor(amt) # Centavos
                             items.append({'name': desc, 'amount': val})
                             cat_total += val
                         except ValueError: continue
@@ -42,9 +47,10 @@ def planner():
                 budget_data[cat_id] = {'items': items, 'total': cat_total}
                 total_budgeted_global += cat_total
             
-            user_ref.collection('monthly_budgets').document(month_key).set({
+            repo.save_monthly_budget(month_key, {
                 'detailed_budget': budget_data,
                 'total_global': total_budgeted_global,
+                'currency': currency,
                 'updated_at': datetime.now()
             })
             
@@ -56,54 +62,34 @@ def planner():
 
     # --- LÓGICA GET: MOSTRAR ---
     
-    # 1. Ingresos
-    income_docs = user_ref.collection('income').stream()
-    total_income = 0
-    for doc in income_docs:
-        d = doc.to_dict()
-        freq = d.get('frequency', 'ocasional')
-        amt = float(d.get('amount', 0))
-        if freq == 'mensual': total_income += amt
-        elif freq == 'quincenal': total_income += (amt * 26) / 12
-        elif freq == 'anual': total_income += amt / 12
-
-    # 2. Gastos Reales
-    expenses_ref = user_ref.collection('expenses')
-    expenses_docs = expenses_ref.stream()
-    actual_spent_by_cat = {}
-    
-    for doc in expenses_docs:
-        d = doc.to_dict()
-        date_str = d.get('date')
-        if date_str:
-            try:
-                e_date = datetime.strptime(date_str, '%Y-%m-%d')
-                if e_date.year == now.year and e_date.month == now.month:
-                    c_id = d.get('categoryId')
-                    amt = float(d.get('amount', 0))
-                    
-                    freq = d.get('frequency', 'ocasional')
-                    val_to_sum = amt
-                    if freq == 'quincenal': val_to_sum = (amt * 26) / 12
-                    elif freq == 'anual': val_to_sum = amt / 12
-                    
-                    actual_spent_by_cat[c_id] = actual_spent_by_cat.get(c_id, 0) + val_to_sum
-            except: pass
+    # Todos los presupuestos guardados (una consulta) y los rollups de esos meses (un get_all):
+    # el arrastre recorre todos los meses presupuestados hasta este, sin límite hacia atrás
+    data = load_parallel(categories=repo.list_categories, budgets=repo.list_monthly_budgets)
+    months = sorted({key for key in data.budgets if key < month_key} | {month_key})
+    recurring, month_rollups = repo.get_month_rollups(months)
+
+    # 1. Ingresos fijos vigentes este mes (desde el rollup recurrente)
+    total_income = recurring[month_key]['income']
+
+    # 2. Planeado vs. real de cada mes y categoría, y el arrastre acumulado (una pasada de cumsum)
+    cat_ids = [c['id'] for c in data.categories]
+    matrix = build_matrix(months, cat_ids, data.budgets, recurring, month_rollups)
+    rollover_in = matrix.rollover()[-1]
+    spent_this_month = matrix.actual[-1]
 
     # 3. Datos Guardados y Categorías
-    cats_docs = user_ref.collection('categories').stream()
-    budget_doc = user_ref.collection('monthly_budgets').document(month_key).get()
-    saved_budget_data = budget_doc.to_dict().get('detailed_budget', {}) if budget_doc.exists else {}
+    saved_budget_data = data.budgets.get(month_key, {}).get('detailed_budget', {})
 
     categories_data = []
-    for doc in cats_docs:
-        c = doc.to_dict()
-        c_id = doc.id
+    for index, c in enumerate(data.categories):
+        c_id = c['id']
         
         cat_plan = saved_budget_data.get(c_id, {})
         saved_items = cat_plan.get('items', [])
         planned_total = cat_plan.get('total', 0)
-        spent_real = actual_spent_by_cat.get(c_id, 0)
+        spent_real = int(spent_this_month[index])
+        # Lo que sobró (o faltó) en los meses anteriores pasa a este
+        rollover = int(rollover_in[index])
         
         # AQUÍ ESTÁ LA CLAVE: Usamos el porcentaje que el usuario definió
         user_percent = c.get('budget_percent', 0)
@@ -117,6 +103,8 @@ def planner():
             'rule_limit': rule_limit,
             'planned_total': planned_total,
             'spent_real': spent_real,
+            'rollover': rollover,
+            'available': planned_total + rollover - spent_real,
             'saved_items': saved_items
         })
 
@@ -125,15 +113,57 @@ def planner():
                            total_income=total_income,
                            month_name=now.strftime('%B').capitalize())
 
+# --- INFORME: PRESUPUESTO VS. REAL DE TODOS LOS MESES ---
+@budget_bp.route('/report')
+@login_required
+def report():
+    """
+    Planeado vs. real por mes y categoría para todos los presupuestos guardados.
+    Dos lecturas en total (la colección monthly_budgets y un get_all de los
+    rollups de esos meses); el real de cada mes suma los fijos vigentes en
+    ese mes, no los de hoy. La diferencia se calcula con NumPy y el resultado
+    se envía en streaming como HTML o, con ?format=csv, como CSV.
+    """
+    repo = get_repo()
+    data = load_parallel(budgets=repo.list_monthly_budgets, categories=repo.list_categories, currency=repo.currency)
+    months = sorted(data.budgets)
+    recurring, month_rollups = repo.get_month_rollups(months)
+
+    categories = data.categories
+    matrix = build_matrix(months, [c['id'] for c in categories], data.budgets, recurring, month_rollups)
+    rows = report_rows(matrix)
+
+    if request.args.get('format') == 'csv':
+        to_major = lambda value: f"{from_minor(value):.{MINOR_DIGITS}f}"
+
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['mes', 'categoria', 'planeado', 'real', 'diferencia', 'moneda'])
+            for month, col, planned, actual, variance in rows:
+                writer.writerow([month, categories[col].get('name'), to_major(planned), to_major(actual),
+                                 to_major(variance), data.currency])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            yield buffer.getvalue()
+
+        return Response(stream_with_context(generate()), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=presupuesto_vs_real.csv'})
+
+    # Totales por mes (suma por filas de las matrices)
+    month_totals = list(zip(months, matrix.planned.sum(axis=1).tolist(), matrix.actual.sum(axis=1).tolist(),
+                            matrix.variance.sum(axis=1).tolist()))
+    return stream_template('budget_report.html', rows=rows, categories=categories,
+                           month_totals=month_totals, currency=data.currency)
+
 # --- NUEVA RUTA: ACTUALIZAR REGLAS (PORCENTAJES) ---
 @budget_bp.route('/update_rules', methods=['POST'])
 @login_required
 def update_rules():
-    user_id = session['user']
     try:
         total_percent = 0
-        batch = db.batch() # Usamos batch para guardar todo junto
-        user_ref = db.collection('users').document(user_id)
+        percents = {}
         
         # Recorremos el formulario
         for key, value in request.form.items():
@@ -141,9 +171,7 @@ def update_rules():
                 cat_id = key.split('rule_percent_')[1]
                 new_percent = int(value)
                 total_percent += new_percent
-                
-                cat_ref = user_ref.collection('categories').document(cat_id)
-                batch.update(cat_ref, {'budget_percent': new_percent})
+                percents[cat_id] = new_percent
         
         # Validación opcional: Advertir si no suma 100%, pero permitir guardar
         if total_percent != 100:
@@ -151,7 +179,7 @@ def update_rules():
         else:
             flash('Reglas de presupuesto actualizadas correctamente.', 'success')
             
-        batch.commit()
+        get_repo().update_category_percents(percents)
         
     except Exception as e:
         flash(f'Error al actualizar reglas: {e}', 'danger')
@@ -1,8 +1,10 @@
 # /blueprints/expenses.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from datetime import datetime
-from firebase_config import db
+from services.repository import get_repo
+from services.loader import load_parallel
+from services.money import to_minor
 from .auth import login_required
 
 expenses_bp = Blueprint('expenses', __name__, template_folder='../templates')
@@ -10,91 +12,66 @@ expenses_bp = Blueprint('expenses', __name__, template_folder='../templates')
 @expenses_bp.route('/history')
 @login_required
 def history():
-    user_id = session['user']
+    repo = get_repo()
+    page_token = request.args.get('page')
+    month_key = datetime.now().strftime('%Y-%m')
     
-    # 1. Obtener gastos
-    expenses_ref = db.collection('users').document(user_id).collection('expenses')
-    expenses_docs = expenses_ref.stream()
-    
-    # 2. Obtener categorías (Para mostrar nombres y colores)
-    categories_ref = db.collection('users').document(user_id).collection('categories').stream()
-    categories = {doc.id: doc.to_dict() for doc in categories_ref}
-
-    expenses = []
-    total_monthly_projection = 0
+    # 1. Una página de gastos (ordenada en Firestore), 2. categorías (para nombres
+    # y colores) y 3. el resumen del mes para el total proyectado, en paralelo
+    data = load_parallel(
+        page=lambda: repo.page_transactions('expenses', page_token),
+        categories=repo.list_categories,
+        summary=lambda: repo.get_month_summary(month_key),
+    )
+    expenses, next_page = data.page
+    categories = {cat['id']: cat for cat in data.categories}
 
-    for doc in expenses_docs:
-        data = doc.to_dict()
-        data['id'] = doc.id
-        
+    for exp in expenses:
         # Enriquecer con datos de categoría
-        cat_id = data.get('categoryId')
+        cat_id = exp.get('categoryId')
         if cat_id and cat_id in categories:
-            data['category_name'] = categories[cat_id].get('name')
-            data['category_color'] = categories[cat_id].get('color')
+            exp['category_name'] = categories[cat_id].get('name')
+            exp['category_color'] = categories[cat_id].get('color')
         else:
-            data['category_name'] = 'Sin Categoría'
-            data['category_color'] = '#6b7280' # Gris por defecto
+            exp['category_name'] = 'Sin Categoría'
+            exp['category_color'] = '#6b7280' # Gris por defecto
 
-        # Calcular proyección mensual
-        amount = float(data.get('amount', 0))
-        freq = data.get('frequency', 'ocasional') # Por defecto es ocasional
-        
-        if freq == 'mensual':
-            total_monthly_projection += amount
-        elif freq == 'quincenal':
-            total_monthly_projection += (amount * 26) / 12
-        elif freq == 'anual':
-            total_monthly_projection += amount / 12
-        else:
-            # Si es ocasional, solo cuenta para la proyección si es de este mes
-            date_str = data.get('date')
-            if date_str:
-                try:
-                    exp_date = datetime.strptime(date_str, '%Y-%m-%d')
-                    now = datetime.now()
-                    if exp_date.month == now.month and exp_date.year == now.year:
-                        total_monthly_projection += amount
-                except:
-                    pass
-        
-        expenses.append(data)
-
-    # Ordenar por fecha (más reciente primero)
-    expenses.sort(key=lambda x: x.get('date', ''), reverse=True)
+    # El total del mes sale del rollup, no de la página visible
+    total_monthly_projection = data.summary['expenses']
 
     # Necesitamos pasar las categorías al template para el formulario de "Agregar"
-    # Convertimos el dict de categorías a una lista
-    categories_list = [{'id': k, **v} for k, v in categories.items()]
+    categories_list = list(categories.values())
 
     return render_template('expenses_history.html', 
                            expenses=expenses, 
                            total_projection=total_monthly_projection,
                            categories=categories_list,
+                           next_page=next_page,
+                           is_first_page=not page_token,
                            today_date=datetime.now().strftime('%Y-%m-%d'))
 
 @expenses_bp.route('/add', methods=['POST'])
 @login_required
 def add():
-    user_id = session['user']
-    
     description = request.form.get('description')
-    amount = float(request.form.get('amount'))
     category_id = request.form.get('category_id')
     frequency = request.form.get('frequency') # mensual, ocasional, etc.
     date = request.form.get('date')
 
     try:
+        repo = get_repo()
+        currency = repo.currency()
         data = {
             'description': description,
-            'amount': amount,
+            'amount': to_minor(request.form.get('amount')), # Centavos
+            'currency': currency,
             'categoryId': category_id,
             'frequency': frequency,
             'date': date,
             'created_at': datetime.now()
         }
         
-        db.collection('users').document(user_id).collection('expenses').add(data)
+        repo.add_transaction('expenses', data)
         flash('Gasto registrado correctamente.', 'success')
         
     except Exception as e:
@@ -102,12 +79,45 @@ def add():
 
     return redirect(url_for('expenses.history'))
 
+@expenses_bp.route('/edit/<expense_id>', methods=['GET', 'POST'])
+@login_required
+def edit(expense_id):
+    repo = get_repo()
+    if request.method == 'POST':
+        try:
+            # El repositorio descuenta el valor anterior y suma el nuevo en la misma transacción
+            updated = repo.update_transaction('expenses', expense_id, {
+                'description': request.form.get('description'),
+                'amount': to_minor(request.form.get('amount')), # Centavos
+                'currency': repo.currency(),
+                'categoryId': request.form.get('category_id'),
+                'frequency': request.form.get('frequency'),
+                'date': request.form.get('date'),
+            })
+            if updated is None:
+                flash('Gasto no encontrado.', 'danger')
+            else:
+                flash('Gasto actualizado.', 'success')
+        except Exception as e:
+            flash(f'Error al actualizar: {e}', 'danger')
+        return redirect(url_for('expenses.history'))
+
+    data = load_parallel(
+        expense=lambda: repo.get_transaction('expenses', expense_id),
+        categories=repo.list_categories,
+    )
+    if data.expense is None:
+        flash('Gasto no encontrado.', 'danger')
+        return redirect(url_for('expenses.history'))
+    return render_template('edit_transaction.html', kind='expenses', item=data.expense, categories=data.categories,
+                           action=url_for('expenses.edit', expense_id=expense_id),
+                           back=url_for('expenses.history'))
+
 @expenses_bp.route('/delete/<expense_id>', methods=['POST'])
 @login_required
 def delete(expense_id):
-    user_id = session['user']
     try:
-        db.collection('users').document(user_id).collection('expenses').document(expense_id).delete()
+        get_repo().delete_transaction('expenses', expense_id)
         flash('Gasto eliminado.', 'success')
     except Exception as e:
         flash(f'Error al eliminar: {e}', 'danger')
@@ -1,8 +1,11 @@
 # /blueprints/income.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from datetime import datetime
-from firebase_config import db
+from services.repository import get_repo
+from services.loader import load_parallel
+from services.money import to_minor
+from services import projection
 from .auth import login_required # Reutilizamos tu decorador de seguridad
 
 income_bp = Blueprint('income', __name__, template_folder='../templates')
@@ -10,58 +13,48 @@ income_bp = Blueprint('income', __name__, template_folder='../templates')
 @income_bp.route('/history')
 @login_required
 def history():
-    user_id = session['user']
-    
-    # Obtenemos todos los ingresos registrados
-    income_ref = db.collection('users').document(user_id).collection('income')
-    docs = income_ref.stream()
-    
-    incomes = []
-    total_monthly_projection = 0
+    repo = get_repo()
+    page_token = request.args.get('page')
+    month_key = datetime.now().strftime('%Y-%m')
 
-    for doc in docs:
-        data = doc.to_dict()
-        data['id'] = doc.id
-        
-        # Calculamos cuánto aporta esto al mes (solo visualmente para esta tabla)
-        amount = data.get('amount', 0)
-        freq = data.get('frequency', 'mensual')
-        
-        if freq == 'quincenal':
-            monthly_val = (amount * 26) / 12
-        elif freq == 'anual':
-            monthly_val = amount / 12
-        else: # mensual u ocasional
-            monthly_val = amount
+    # Una página de ingresos (ordenada en Firestore) y el resumen del mes, en paralelo
+    data = load_parallel(
+        page=lambda: repo.page_transactions('income', page_token),
+        summary=lambda: repo.get_month_summary(month_key),
+    )
+    incomes, next_page = data.page
+
+    # Cuánto aporta cada ingreso al mes en curso (solo visualmente para esta tabla), con el motor compartido
+    month_projection = projection.project_month(incomes, month_key)
+    for inc, monthly_val in zip(incomes, month_projection['effective']):
+        inc['monthly_val'] = int(monthly_val)
 
-        # Marcamos si es un ingreso fijo (recurrente) vs ocasional
-        # Asumimos que si tiene frecuencia definida es "fijo"
-        data['monthly_val'] = monthly_val
-        incomes.append(data)
-        total_monthly_projection += monthly_val
+    # Proyección mensual: fijos mensualizados + ocasionales del mes (desde el rollup)
+    total_monthly_projection = data.summary['income']
 
-    return render_template('income_history.html', incomes=incomes, total_projection=total_monthly_projection)
+    return render_template('income_history.html', incomes=incomes, total_projection=total_monthly_projection,
+                           next_page=next_page, is_first_page=not page_token)
 
 @income_bp.route('/add', methods=['POST'])
 @login_required
 def add():
-    user_id = session['user']
-    
     source = request.form.get('source')
-    amount = float(request.form.get('amount'))
     frequency = request.form.get('frequency') # mensual, quincenal, ocasional
     date = request.form.get('date', datetime.now().strftime('%Y-%m-%d'))
 
     try:
+        repo = get_repo()
+        currency = repo.currency()
         data = {
             'source': source,
-            'amount': amount,
+            'amount': to_minor(request.form.get('amount')), # Centavos
+            'currency': currency,
             'frequency': frequency,
             'date': date,
             'created_at': datetime.now()
         }
         
-        db.collection('users').document(user_id).collection('income').add(data)
+        repo.add_transaction('income', data)
         flash('Ingreso agregado correctamente.', 'success')
         
     except Exception as e:
@@ -70,12 +63,41 @@ def add():
     # Nos mantenemos en la página de historial
     return redirect(url_for('income.history'))
 
+@income_bp.route('/edit/<income_id>', methods=['GET', 'POST'])
+@login_required
+def edit(income_id):
+    repo = get_repo()
+    if request.method == 'POST':
+        try:
+            # El repositorio descuenta el valor anterior y suma el nuevo en la misma transacción
+            updated = repo.update_transaction('income', income_id, {
+                'source': request.form.get('source'),
+                'amount': to_minor(request.form.get('amount')), # Centavos
+                'currency': repo.currency(),
+                'frequency': request.form.get('frequency'),
+                'date': request.form.get('date'),
+            })
+            if updated is None:
+                flash('Ingreso no encontrado.', 'danger')
+            else:
+                flash('Ingreso actualizado.', 'success')
+        except Exception as e:
+            flash(f'Error al actualizar: {e}', 'danger')
+        return redirect(url_for('income.history'))
+
+    income = repo.get_transaction('income', income_id)
+    if income is None:
+        flash('Ingreso no encontrado.', 'danger')
+        return redirect(url_for('income.history'))
+    return render_template('edit_transaction.html', kind='income', item=income,
+                           action=url_for('income.edit', income_id=income_id),
+                           back=url_for('income.history'))
+
 @income_bp.route('/delete/<income_id>', methods=['POST'])
 @login_required
 def delete(income_id):
-    user_id = session['user']
     try:
-        db.collection('users').document(user_id).collection('income').document(income_id).delete()
+        get_repo().delete_transaction('income', income_id)
         flash('Ingreso eliminado.', 'success')
     except Exception as e:
         flash(f'Error al eliminar: {e}', 'danger')
@@ -1,6 +1,5 @@
 # blueprints/learning.py
 
-import pandas as pd
 import random
 from flask import Blueprint, render_template, request, session, abort
 from .auth import login_required
@@ -1,14 +1,26 @@
 # /blueprints/main.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from functools import wraps
+import json
 from datetime import datetime
-from firebase_config import db # Importamos solo la base de datos
+from services.repository import get_repo # Todo acceso a Firestore pasa por el repositorio
+from services.loader import load_parallel
+from services import recurrence
+from services.money import MINOR_DIGITS, to_minor
+from services.projection import UNCATEGORIZED
+from services.transactions import add_months, month_code, month_key, month_range
 from .auth import login_required # Importamos el decorador desde nuestro blueprint de auth
 
 # Creamos el Blueprint para las rutas principales de la aplicación.
 main_bp = Blueprint('main', __name__, template_folder='../templates')
 
+# Meses que muestran los gráficos por defecto y máximo por consulta
+DEFAULT_CHART_MONTHS = 12
+MAX_CHART_MONTHS = 120
+# Meses que muestra el calendario de flujo de caja (el máximo es el horizonte de la expansión)
+DEFAULT_CASHFLOW_MONTHS = 3
+
 
 # --- DECORADOR DE RUTAS ---
 def onboarding_required(f):
@@ -21,15 +33,14 @@ def onboarding_required(f):
         user_id = session.get('user')
         if not user_id: return redirect(url_for('auth.login'))
         
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        repo = get_repo()
         
-        if user_doc.exists and user_doc.to_dict().get('onboarding_complete', False):
+        # Solo consulta Firestore hasta que el onboarding se completa (luego lo recuerda la sesión)
+        if repo.is_onboarding_complete():
             return f(*args, **kwargs)
         else:
             # Lógica para redirigir al paso correcto del onboarding
-            income_check = user_ref.collection('income').limit(1).get()
-            if not income_check:
+            if not repo.has_income():
                 return redirect(url_for('main.onboarding_income'))
             return redirect(url_for('main.onboarding_budget'))
     return decorated_function
@@ -45,7 +56,6 @@ def onboarding_welcome():
 @main_bp.route('/onboarding/income', methods=['GET', 'POST'])
 @login_required
 def onboarding_income():
-    user_id = session['user']
     if request.method == 'POST':
         try:
             # --- INICIO DE LA NUEVA LÓGICA DE PROCESAMIENTO ---
@@ -60,6 +70,7 @@ def onboarding_income():
                             incomes_data[index] = {}
                         incomes_data[index][field] = value
 
+            currency = get_repo().currency()
             incomes_to_save = []
             # Validamos cada grupo de ingresos recolectado
             for index in sorted(incomes_data.keys()):
@@ -72,7 +83,7 @@ def onboarding_income():
                     continue # Ignorar entradas incompletas
 
                 try:
-                    amount = float(amount_str)
+                    amount = to_minor(amount_str) # Montos en centavos
                 except (ValueError, TypeError):
                     flash(f"El monto '{amount_str}' no es un número válido.", "danger")
                     return redirect(url_for('main.onboarding_income'))
@@ -84,6 +95,7 @@ def onboarding_income():
                 incomes_to_save.append({
                     'source': source,
                     'amount': amount,
+                    'currency': currency,
                     'frequency': frequency,
                     'date': datetime.now().strftime('%Y-%m-%d')
                 })
@@ -95,13 +107,7 @@ def onboarding_income():
             # --- FIN DE LA NUEVA LÓGICA ---
 
             # Procedemos a guardar en la base de datos
-            income_ref = db.collection('users').document(user_id).collection('income')
-            
-            for doc in income_ref.stream():
-                doc.reference.delete()
-            
-            for income_data in incomes_to_save:
-                income_ref.add(income_data)
+            get_repo().replace_income(incomes_to_save)
             
             return redirect(url_for('main.onboarding_budget'))
 
@@ -111,10 +117,9 @@ def onboarding_income():
 
     # Lógica para cargar la página (petición GET)
     try:
-        user_doc = db.collection('users').document(user_id).get()
-        user_data = user_doc.to_dict() if user_doc.exists else {}
-        incomes_stream = db.collection('users').document(user_id).collection('income').stream()
-        existing_incomes = [doc.to_dict() for doc in incomes_stream]
+        repo = get_repo()
+        user_data = repo.get_user()
+        existing_incomes = repo.list_income()
         return render_template('onboarding_income.html', user=user_data, incomes=existing_incomes)
     except Exception as e:
         flash(f"Error al cargar la página: {e}", "danger")
@@ -124,48 +129,41 @@ def onboarding_income():
 @main_bp.route('/onboarding/budget', methods=['GET', 'POST'])
 @login_required
 def onboarding_budget():
-    user_id = session['user']
     if request.method == 'POST':
         return redirect(url_for('main.onboarding_savings'))
     
-    categories_docs = db.collection('users').document(user_id).collection('categories').stream()
-    categories = [doc.to_dict() for doc in categories_docs]
+    categories = get_repo().list_categories()
     return render_template('onboarding_budget.html', categories=categories)
 
 @main_bp.route('/onboarding/savings', methods=['GET', 'POST'])
 @login_required
 def onboarding_savings():
-    user_id = session['user']
+    repo = get_repo()
     if request.method == 'POST':
         goal = request.form.get('goal')
-        db.collection('users').document(user_id).collection('savings').document('emergency_fund').update({
-            'goal': float(goal)
-        })
-        db.collection('users').document(user_id).update({'onboarding_complete': True})
+        repo.complete_onboarding(savings_goal=to_minor(goal))
         flash('¡Configuración completada! Ya puedes empezar a usar tu billetera.', 'success')
         return redirect(url_for('main.dashboard'))
     
-    income_docs = db.collection('users').document(user_id).collection('income').stream()
-    total_income = sum(doc.to_dict().get('amount', 0) for doc in income_docs)
+    # Firestore suma los montos (en centavos) y solo devuelve el total
+    total_income = repo.sum_field('income', 'amount')
     suggested_goal = total_income * 3
     return render_template('onboarding_savings.html', suggested_goal=suggested_goal)
 
 @main_bp.route('/skip-savings')
 @login_required
 def skip_savings_goal():
-    user_id = session['user']
-    db.collection('users').document(user_id).update({'onboarding_complete': True})
+    get_repo().complete_onboarding()
     flash('Puedes configurar tu meta de ahorro más tarde. ¡Bienvenido/a!', 'success')
     return redirect(url_for('main.dashboard'))
 
 @main_bp.route('/onboarding/currency', methods=['GET', 'POST'])
 @login_required
 def onboarding_currency():
-    user_id = session['user']
     if request.method == 'POST':
         currency = request.form.get('currency')
         if currency:
-            db.collection('users').document(user_id).update({'currency': currency})
+            get_repo().update_user({'currency': currency})
             # Una vez guardada la moneda, lo enviamos al siguiente paso que era el de ingresos.
             return redirect(url_for('main.onboarding_income'))
         else:
@@ -180,97 +178,39 @@ def onboarding_currency():
 @login_required
 @onboarding_required
 def dashboard():
-    user_id = session['user']
+    repo = get_repo()
     try:
-        # 1. DATOS DE USUARIO Y FECHA
-        user_doc = db.collection('users').document(user_id).get()
-        user_data = user_doc.to_dict() if user_doc.exists else {}
-        
         now = datetime.now()
-        current_month = now.month
-        current_year = now.year
-
-        # 2. OBTENER COLECCIONES
-        income_docs = db.collection('users').document(user_id).collection('income').stream()
-        expenses_docs = db.collection('users').document(user_id).collection('expenses').stream()
-        categories_docs = db.collection('users').document(user_id).collection('categories').stream()
-
-        all_income = [doc.to_dict() for doc in income_docs]
-        all_expenses = [doc.to_dict() for doc in expenses_docs]
-        all_categories = [{'id': doc.id, **doc.to_dict()} for doc in categories_docs]
-
-        # 3. CALCULAR INGRESOS (Híbrido: Fijos + Variables del mes)
-        total_monthly_income = 0
-        for inc in all_income:
-            freq = inc.get('frequency', 'ocasional')
-            amount = float(inc.get('amount', 0))
-            
-            if freq == 'mensual':
-                total_monthly_income += amount
-            elif freq == 'quincenal':
-                total_monthly_income += (amount * 26) / 12
-            elif freq == 'anual':
-                total_monthly_income += amount / 12
-            else: # Ocasional
-                inc_date_str = inc.get('date')
-                if inc_date_str:
-                    try:
-                        inc_date = datetime.strptime(inc_date_str, '%Y-%m-%d')
-                        if inc_date.month == current_month and inc_date.year == current_year:
-                            total_monthly_income += amount
-                    except ValueError: pass
-
-        # 4. CALCULAR GASTOS (Híbrido) Y PREPARAR LISTA PARA CATEGORÍAS
-        total_monthly_expenses = 0
-        monthly_expenses_active = [] # Lista con el monto mensualizado para cálculos de categoría
-
-        for exp in all_expenses:
-            freq = exp.get('frequency', 'ocasional')
-            amount = float(exp.get('amount', 0))
-            is_active_this_month = False
-            effective_amount = 0 # Cuánto impacta este gasto al mes (ej. quincenal se ajusta)
-
-            # Lógica de Proyección
-            if freq == 'mensual':
-                effective_amount = amount
-                is_active_this_month = True
-            elif freq == 'quincenal':
-                effective_amount = (amount * 26) / 12
-                is_active_this_month = True
-            elif freq == 'anual':
-                effective_amount = amount / 12
-                is_active_this_month = True
-            else: # Ocasional
-                exp_date_str = exp.get('date')
-                if exp_date_str:
-                    try:
-                        exp_date = datetime.strptime(exp_date_str, '%Y-%m-%d')
-                        if exp_date.month == current_month and exp_date.year == current_year:
-                            effective_amount = amount
-                            is_active_this_month = True
-                    except ValueError: pass
-            
-            # Si el gasto cuenta este mes, sumamos al total global y lo guardamos para categorías
-            if is_active_this_month:
-                total_monthly_expenses += effective_amount
-                # Guardamos una copia con el monto "efectivo" para que la suma por categoría cuadre
-                active_expense = exp.copy()
-                active_expense['effective_amount'] = effective_amount
-                monthly_expenses_active.append(active_expense)
-
-        # 5. PROCESAR CATEGORÍAS
+        current_month = now.strftime('%Y-%m')
+
+        # 1 y 2. USUARIO, RESUMEN DEL MES (rollup) Y CATEGORÍAS, EN PARALELO
+        data = load_parallel(
+            user=repo.get_user,
+            summary=lambda: repo.get_month_summary(current_month),
+            categories=repo.list_categories,
+        )
+        user_data = data.user
+        summary = data.summary
+        all_categories = data.categories
+
+        # 3. TOTALES (Híbrido: Fijos mensualizados + Ocasionales del mes)
+        total_monthly_income = summary['income']
+        total_monthly_expenses = summary['expenses']
+        spent_by_category = summary['expenses_by_category']
+
+        # 4. PROCESAR CATEGORÍAS
         # Usamos 'total_monthly_income' para definir el tope de gasto (Presupuesto)
         total_budgeted = total_monthly_income 
         
+        # El gasto ya viene agrupado por categoryId (una sola pasada al escribir/reconstruir
+        # el rollup), así que aquí solo hay una búsqueda en diccionario por categoría
         expenses_by_category = []
         for cat in all_categories:
-            if not cat: continue
-            
             # Presupuesto de esta categoría = % del Ingreso Total Real
             budget_amount = total_monthly_income * (cat.get('budget_percent', 0) / 100)
             
-            # Lo gastado en esta categoría (Usando los montos mensualizados calculados arriba)
-            spent = sum(x['effective_amount'] for x in monthly_expenses_active if x.get('categoryId') == cat.get('id'))
+            # Lo gastado en esta categoría (montos ya mensualizados en el rollup)
+            spent = spent_by_category.get(cat.get('id'), 0)
             
             percentage = (spent / budget_amount * 100) if budget_amount > 0 else 0
             
@@ -303,21 +243,23 @@ def dashboard():
 @main_bp.route('/add_transaction', methods=['POST'])
 @login_required
 def add_transaction_route():
-    user_id = session['user']
+    repo = get_repo()
     trans_type = request.form.get('type')
     description = request.form.get('description')
-    amount = float(request.form.get('amount'))
+    currency = repo.currency()
+    amount = to_minor(request.form.get('amount'))
     date = request.form.get('date')
 
     if trans_type == 'expense':
         category_id = request.form.get('category_id')
-        db.collection('users').document(user_id).collection('expenses').add({
-            'description': description, 'amount': amount, 'categoryId': category_id, 'date': date
+        repo.add_transaction('expenses', {
+            'description': description, 'amount': amount, 'currency': currency,
+            'categoryId': category_id, 'date': date
         })
         flash('Gasto añadido con éxito.', 'success')
     elif trans_type == 'income':
-        db.collection('users').document(user_id).collection('income').add({
-            'source': description, 'amount': amount, 'date': date
+        repo.add_transaction('income', {
+            'source': description, 'amount': amount, 'currency': currency, 'date': date
         })
         flash('Ingreso añadido con éxito.', 'success')
     
@@ -327,31 +269,28 @@ def add_transaction_route():
 @login_required
 @onboarding_required
 def budget():
-    user_id = session['user']
-    user_ref = db.collection('users').document(user_id)
+    repo = get_repo()
     
     if request.method == 'POST':
-        for doc in user_ref.collection('categories').stream():
-            cat_id = doc.id
-            percent_val = request.form.get(f'percent_{cat_id}')
+        percents = {}
+        for cat in repo.list_categories():
+            percent_val = request.form.get(f"percent_{cat['id']}")
             if percent_val:
-                doc.reference.update({'budget_percent': int(percent_val)})
+                percents[cat['id']] = int(percent_val)
+        repo.update_category_percents(percents)
         flash('Presupuesto actualizado.', 'success')
         return redirect(url_for('main.budget'))
 
-    income_docs = user_ref.collection('income').stream()
-    all_income = [{'id': doc.id, **doc.to_dict()} for doc in income_docs]
-    
-    categories_docs = user_ref.collection('categories').stream()
-    all_categories = [{'id': doc.id, **doc.to_dict()} for doc in categories_docs]
+    data = load_parallel(income=repo.list_income, categories=repo.list_categories)
+    all_income = data.income
+    all_categories = data.categories
 
     return render_template('budget.html', incomes=all_income, categories=all_categories, today_date=datetime.now().strftime('%Y-%m-%d'))
 
 @main_bp.route('/delete_income/<income_id>', methods=['POST'])
 @login_required
 def delete_income_route(income_id):
-    user_id = session['user']
-    db.collection('users').document(user_id).collection('income').document(income_id).delete()
+    get_repo().delete_transaction('income', income_id)
     flash('Ingreso eliminado.', 'success')
     return redirect(url_for('main.budget'))
 
@@ -359,31 +298,141 @@ def delete_income_route(income_id):
 @login_required
 @onboarding_required
 def savings():
-    user_id = session['user']
-    emergency_fund_doc = db.collection('users').document(user_id).collection('savings').document('emergency_fund').get()
-    emergency_fund = emergency_fund_doc.to_dict() if emergency_fund_doc.exists else {'goal': 0, 'current': 0}
-    savings_goals_docs = db.collection('users').document(user_id).collection('savings_goals').stream()
-    savings_goals = [{'id': doc.id, **doc.to_dict()} for doc in savings_goals_docs]
+    repo = get_repo()
+    data = load_parallel(emergency_fund=repo.get_emergency_fund, savings_goals=repo.list_savings_goals)
+    emergency_fund = data.emergency_fund
+    savings_goals = data.savings_goals
     return render_template('savings.html', emergency_fund=emergency_fund, savings_goals=savings_goals)
     
 @main_bp.route('/charts')
 @login_required
 @onboarding_required
 def charts():
+    # La página pide sus datos a /charts/data (JSON cacheable por el navegador)
     return render_template('charts.html')
 
+@main_bp.route('/charts/data')
+@login_required
+def charts_data():
+    """
+    Series mensuales de ingresos y gastos (totales y por categoría) entre
+    ?from=YYYY-MM y ?to=YYYY-MM, por defecto los últimos 12 meses. Se calculan
+    con los rollups (un get_all), y la respuesta lleva ETag y Last-Modified
+    para que el navegador revalide con un 304.
+    """
+    end = month_code(request.args.get('to') or datetime.now().strftime('%Y-%m'))
+    start = month_code(request.args.get('from')) if request.args.get('from') else add_months(end, 1 - DEFAULT_CHART_MONTHS)
+    if not start or not end or start > end:
+        return jsonify({'error': 'Rango de meses no válido (usa from/to con formato YYYY-MM).'}), 400
+    months = [month_key(code) for code in month_range(start, end)]
+    if len(months) > MAX_CHART_MONTHS:
+        return jsonify({'error': f'El rango máximo es de {MAX_CHART_MONTHS} meses.'}), 400
+
+    repo = get_repo()
+    data = load_parallel(
+        series=lambda: repo.get_month_series(months),
+        categories=repo.list_categories,
+        currency=repo.currency,
+    )
+    series = data.series
+
+    # Una serie por categoría del usuario; lo que no tenga categoría conocida va a 'Sin categoría'
+    spent = dict(series['expenses_by_category'])
+    categories = []
+    for cat in data.categories:
+        categories.append({'id': cat['id'], 'name': cat.get('name'), 'color': cat.get('color'),
+                           'expenses': spent.pop(cat['id'], [0] * len(months))})
+    if spent:
+        others = [sum(values) for values in zip(*spent.values())]
+        categories.append({'id': UNCATEGORIZED, 'name': 'Sin categoría', 'color': '#6b7280', 'expenses': others})
+
+    payload = {
+        'months': months,
+        'currency': data.currency,
+        'digits': MINOR_DIGITS, # Montos en unidades menores
+        'incomes': series['incomes'],
+        'expenses': series['expenses'],
+        'categories': categories,
+    }
+    # JSON compacto (sin sangría ni espacios) también en modo debug
+    response = current_app.response_class(json.dumps(payload, separators=(',', ':')), mimetype='application/json')
+    response.add_etag()
+    if series['updated_at']:
+        response.last_modified = series['updated_at']
+    # Siempre revalidar: si nada cambió, el servidor responde 304 sin cuerpo
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@main_bp.route('/cashflow')
+@login_required
+@onboarding_required
+def cashflow():
+    """
+    Calendario de flujo de caja: cada cobro y pago recurrente de los próximos
+    ?months=N meses, con el neto de cada mes y el saldo acumulado. Sale de la
+    expansión de los recurrentes (services/recurrence.py), cacheada en el
+    worker para todo el horizonte; aquí solo se recorta a los meses pedidos.
+    """
+    months = request.args.get('months', DEFAULT_CASHFLOW_MONTHS, type=int)
+    months = min(max(months, 1), recurrence.DEFAULT_HORIZON_MONTHS)
+    start, end = recurrence.horizon(months)
+
+    repo = get_repo()
+    data = load_parallel(
+        calendar=repo.get_recurring_calendar,
+        categories=repo.list_categories,
+        currency=repo.currency,
+    )
+    income, expenses = data.calendar['income'], data.calendar['expenses']
+    category_names = {cat['id']: cat.get('name') for cat in data.categories}
+
+    # Ocurrencias del periodo agrupadas por mes ('YYYY-MM'), en orden de fecha
+    last_day = end.isoformat()
+    by_month = {}
+    for kind, occurrences in (('income', income), ('expense', expenses)):
+        for item in occurrences.to_list():
+            if item['date'] > last_day:
+                break
+            item['type'] = kind
+            item['category'] = category_names.get(item['categoryId'], 'Sin categoría') if kind == 'expense' else None
+            by_month.setdefault(item['date'][:7], []).append(item)
+
+    # Totales por mes con la misma expansión (un bincount por colección)
+    month_income = income.monthly_totals(start, months)
+    month_expenses = expenses.monthly_totals(start, months)
+    first = month_code(start.isoformat())
+    calendar, balance = [], 0
+    for i, code in enumerate(month_range(first, add_months(first, months - 1))):
+        key = month_key(code)
+        net = int(month_income[i] - month_expenses[i])
+        balance += net
+        calendar.append({
+            'month': key,
+            'income': int(month_income[i]),
+            'expenses': int(month_expenses[i]),
+            'net': net,
+            'balance': balance,
+            'items': sorted(by_month.get(key, []), key=lambda item: item['date']),
+        })
+
+    return render_template('cashflow.html', calendar=calendar, months=months,
+                           max_months=recurrence.DEFAULT_HORIZON_MONTHS, currency=data.currency)
+
 @main_bp.route('/category/<category_id>')
 @login_required
 @onboarding_required
 def category_detail(category_id):
-    user_id = session['user']
-    category_doc = db.collection('users').document(user_id).collection('categories').document(category_id).get()
-    if not category_doc.exists:
+    repo = get_repo()
+    category = repo.get_category(category_id)
+    if category is None:
         return "Categoría no encontrada", 404
     
-    category = {'id': category_doc.id, **category_doc.to_dict()}
-    
-    expenses_docs = db.collection('users').document(user_id).collection('expenses').where('categoryId', '==', category_id).stream()
-    expenses = sorted([doc.to_dict() for doc in expenses_docs], key=lambda x: x['date'], reverse=True)
+    # Firestore filtra por categoría y mes (?month=YYYY-MM, por defecto el actual)
+    # y devuelve la página ya ordenada por fecha (?page=<token>)
+    selected_month = request.args.get('month') or datetime.now().strftime('%Y-%m')
+    page_token = request.args.get('page')
+    expenses, next_page = repo.page_transactions('expenses', page_token, month=selected_month, category_id=category_id)
     
-    return render_template('category_detail.html', category=category, expenses=expenses)
+    return render_template('category_detail.html', category=category, expenses=expenses, month_key=selected_month,
+                           next_page=next_page, is_first_page=not page_token)
@@ -0,0 +1,22 @@
+# /gunicorn.conf.py
+
+"""
+Configuración de gunicorn (se lee sola al ejecutar `gunicorn app:app` desde la raíz).
+
+Con preload_app la app se importa una sola vez en el proceso maestro antes de
+crear los workers, incluido el modelo de modelos/predecir.py. Los workers
+heredan esa memoria copy-on-write y, como los arrays del modelo están
+mapeados en solo lectura (mmap), nunca se copian: la RAM del modelo se paga
+una vez, no una por worker. Para medirlo: python modelos/medir_memoria.py
+
+Es seguro con Firestore: el cliente abre su canal gRPC en la primera
+consulta, ya dentro de cada worker, no al importarse.
+
+El puerto ($PORT) y el número de workers ($WEB_CONCURRENCY) los toma
+gunicorn de las variables de entorno, como hasta ahora.
+"""
+
+import os
+
+# GUNICORN_PRELOAD=0 desactiva la precarga (cada worker importa la app por su cuenta)
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
@@ -0,0 +1,146 @@
+# modelos/bosque.py
+"""
+Bosque aleatorio en arrays planos de NumPy (sin scikit-learn).
+
+exportar() aplana los árboles de un RandomForestClassifier entrenado en un
+directorio con un .npy por array: por nodo, la columna que compara, el umbral, los hijos y las
+probabilidades de cada clase en las hojas. Con los árboles van las clases
+de cada encoder, así que para predecir basta con NumPy: ni pandas, ni
+sklearn, ni unpickle.
+
+Bosque.predict() recorre todos los árboles a la vez para todo el lote: en
+cada paso, cada par (fila, árbol) que aún no llegó a una hoja baja un
+nivel. Hace tantas iteraciones como la profundidad del árbol más profundo,
+no una por fila ni por árbol.
+
+Los .npy se abren con np.load(mmap_mode='r'): las páginas vienen de la
+caché del sistema operativo y todos los workers de gunicorn comparten la
+misma copia en RAM en vez de tener una cada uno.
+
+    python modelos/bosque.py   -> exporta binarios/modelo_perfil.pkl a binarios/bosque_perfil/
+                                  (modelos sueltos, anteriores al registro de versiones)
+"""
+
+import os
+import numpy as np
+
+HOJA = -1  # Hijo de las hojas (como TREE_LEAF en sklearn)
+
+
+def guardar_arrays(directorio, datos):
+    """
+    Un .npy por array (sin pickle, mapeable). Cada archivo se escribe aparte
+    y se mueve con os.replace: un worker que ya tiene mapeado el anterior
+    sigue leyendo el archivo viejo en vez de ver uno a medio escribir.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, array in datos.items():
+        ruta = os.path.join(directorio, f'{nombre}.npy')
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'wb') as archivo:
+            np.save(archivo, np.asarray(array), allow_pickle=False)
+        os.replace(temporal, ruta)
+
+
+def cargar_arrays(directorio, mmap=True):
+    """{nombre: array} de un directorio escrito con guardar_arrays, mapeados en solo lectura."""
+    return {
+        archivo[:-len('.npy')]: np.load(os.path.join(directorio, archivo),
+                                        mmap_mode='r' if mmap else None, allow_pickle=False)
+        for archivo in sorted(os.listdir(directorio)) if archivo.endswith('.npy')
+    }
+
+
+def exportar(modelo, encoders, features, directorio):
+    """Guarda el bosque y las clases de los encoders en 'directorio'."""
+    arboles = [arbol.tree_ for arbol in modelo.estimators_]
+    inicio = np.cumsum([0] + [arbol.node_count for arbol in arboles])
+
+    izquierda, derecha, valores = [], [], []
+    for desplazamiento, arbol in zip(inicio, arboles):
+        hoja = arbol.children_left == HOJA
+        # Los índices de los hijos pasan a ser globales; las hojas siguen en -1
+        izquierda.append(np.where(hoja, HOJA, arbol.children_left + desplazamiento))
+        derecha.append(np.where(hoja, HOJA, arbol.children_right + desplazamiento))
+        # Probabilidad por clase en cada nodo, normalizada igual que predict_proba
+        valor = arbol.value[:, 0, :].astype(np.float64)
+        total = valor.sum(axis=1, keepdims=True)
+        total[total == 0.0] = 1.0
+        valores.append(valor / total)
+
+    datos = {
+        'columna': np.concatenate([arbol.feature for arbol in arboles]).astype(np.int64),
+        'umbral': np.concatenate([arbol.threshold for arbol in arboles]),
+        'izquierda': np.concatenate(izquierda).astype(np.int64),
+        'derecha': np.concatenate(derecha).astype(np.int64),
+        'valor': np.concatenate(valores),
+        'raices': inicio[:-1].astype(np.int64),
+        'profundidad': np.int64(max(arbol.max_depth for arbol in arboles)),
+        'clases': np.asarray(modelo.classes_, dtype=str),
+        'features': np.asarray(features, dtype=str),
+    }
+    for col, le in encoders.items():
+        datos[f'encoder_{col}'] = np.asarray(le.classes_, dtype=str)
+    guardar_arrays(directorio, datos)
+
+
+class Bosque:
+    """Evaluador del bosque exportado. Solo necesita NumPy."""
+
+    def __init__(self, datos):
+        self.columna = datos['columna']
+        self.umbral = datos['umbral']
+        self.izquierda = datos['izquierda']
+        self.derecha = datos['derecha']
+        self.valor = datos['valor']
+        self.raices = datos['raices']
+        self.profundidad = int(datos['profundidad'])
+        self.classes_ = datos['clases']
+        self.features = [str(col) for col in datos['features']]
+        # Clases de cada encoder, ordenadas igual que LabelEncoder.classes_
+        self.encoders = {clave[len('encoder_'):]: datos[clave] for clave in datos if clave.startswith('encoder_')}
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        return cls(cargar_arrays(directorio, mmap))
+
+    def hojas(self, X):
+        """Índice de la hoja a la que llega cada fila en cada árbol: int64 [filas, árboles]."""
+        # sklearn compara en float32 contra umbrales float64: igual aquí para obtener las mismas hojas
+        X = np.asarray(X, dtype=np.float32)
+        arboles = len(self.raices)
+        nodos = np.tile(self.raices, len(X))         # un nodo por par (fila, árbol), aplanado
+        filas = np.repeat(np.arange(len(X)), arboles)
+        pendientes = np.arange(len(nodos))           # pares que aún no llegaron a una hoja
+        for _ in range(self.profundidad + 1):
+            actual = nodos[pendientes]
+            izquierda = self.izquierda[actual]
+            seguir = izquierda != HOJA
+            if not seguir.any():
+                break
+            pendientes, actual, izquierda = pendientes[seguir], actual[seguir], izquierda[seguir]
+            a_la_izquierda = X[filas[pendientes], self.columna[actual]] <= self.umbral[actual]
+            nodos[pendientes] = np.where(a_la_izquierda, izquierda, self.derecha[actual])
+        return nodos.reshape(len(X), arboles)
+
+    def predict_proba(self, X):
+        hojas = self.hojas(X)
+        proba = np.zeros((len(hojas), len(self.classes_)))
+        # Se acumula árbol por árbol, en el mismo orden que sklearn, para que los empates coincidan
+        for arbol in range(hojas.shape[1]):
+            proba += self.valor[hojas[:, arbol]]
+        return proba / hojas.shape[1]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+if __name__ == "__main__":
+    import joblib
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    binarios_dir = os.path.join(base_dir, 'binarios')
+    modelo = joblib.load(os.path.join(binarios_dir, 'modelo_perfil.pkl'))
+    encoders = joblib.load(os.path.join(binarios_dir, 'encoders.pkl'))
+    features = list(getattr(modelo, 'feature_names_in_', ['edad'] + list(encoders)))
+    exportar(modelo, encoders, features, os.path.join(binarios_dir, 'bosque_perfil'))
+    print("💾 Bosque exportado a /modelos/binarios/bosque_perfil/")
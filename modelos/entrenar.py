@@ -3,17 +3,52 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+import shutil
+import sys
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 
+try:
+    from modelos import registro
+    from modelos.bosque import exportar, guardar_arrays
+except ImportError:  # Ejecutado como script: python modelos/entrenar.py
+    import registro
+    from bosque import exportar, guardar_arrays
+
 def limpiar_numero(valor):
     """Convierte '1.250.000,01' a 1250000.01"""
     if isinstance(valor, str):
         valor = valor.replace('.', '').replace(',', '.')
     return float(valor)
 
-def entrenar():
+def generar_tabla(modelo, encoders, features, edad_min, edad_max):
+    """
+    Tabla de búsqueda exhaustiva: predice de una vez todas las combinaciones
+    posibles de entradas (cada edad entera entre edad_min y edad_max por cada
+    código de cada columna categórica) y guarda el índice de la clase en un
+    array de NumPy con un eje por columna. Así predecir.py responde con un
+    simple índice, sin llamar al bosque.
+    """
+    categoricas = [col for col in features if col != 'edad']
+    forma = (edad_max - edad_min + 1,) + tuple(len(encoders[col].classes_) for col in categoricas)
+
+    # Una fila por celda de la rejilla, en el mismo orden que 'forma'
+    rejilla = np.indices(forma).reshape(len(forma), -1)
+    X_tabla = pd.DataFrame(dict(zip(['edad'] + categoricas, rejilla)))
+    X_tabla['edad'] += edad_min
+
+    prediccion = modelo.predict(X_tabla[features])
+    codigos = np.searchsorted(modelo.classes_, prediccion).astype(np.uint8)
+
+    return {
+        'tabla': codigos.reshape(forma),
+        'clases': np.asarray(modelo.classes_, dtype=str),
+        'columnas': np.asarray(['edad'] + categoricas),
+        'edad_min': np.int64(edad_min),
+    }
+
+def entrenar(tabla=False):
     print("⏳ Cargando datos...")
     # Rutas dinámicas para que funcione en cualquier PC
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -36,7 +71,8 @@ def entrenar():
     # Convertir texto a números (Encoding)
     encoders = {}
     for col in features:
-        if df_clean[col].dtype == 'object':
+        # Texto: dtype 'object' (o 'str' desde pandas 3)
+        if not pd.api.types.is_numeric_dtype(df_clean[col]):
             le = LabelEncoder()
             df_clean[col] = le.fit_transform(df_clean[col].astype(str))
             encoders[col] = le # Guardamos el traductor para usarlo luego
@@ -56,12 +92,45 @@ def entrenar():
     print(f"✅ Modelo entrenado con éxito. Precisión: {score:.2%}")
 
     # --- 3. GUARDADO ---
+    # Todo se escribe en un directorio temporal; la versión solo se activa al final (ver registro.py)
     binarios_dir = os.path.join(base_dir, 'binarios')
     os.makedirs(binarios_dir, exist_ok=True)
-    
-    joblib.dump(modelo, os.path.join(binarios_dir, 'modelo_perfil.pkl'))
-    joblib.dump(encoders, os.path.join(binarios_dir, 'encoders.pkl'))
-    print("💾 Archivos .pkl guardados en /modelos/binarios/")
+    version_dir = registro.preparar(binarios_dir)
+
+    try:
+        # Sin compresión: joblib.load(..., mmap_mode='r') puede mapear sus arrays
+        joblib.dump(modelo, os.path.join(version_dir, 'modelo_perfil.pkl'))
+        joblib.dump(encoders, os.path.join(version_dir, 'encoders.pkl'))
+
+        # Copia del bosque en arrays de NumPy: la app la carga sin pandas ni sklearn
+        exportar(modelo, encoders, features, os.path.join(version_dir, 'bosque_perfil'))
+
+        # --- 4. TABLA DE BÚSQUEDA (opcional) ---
+        # Todas las entradas son categóricas salvo la edad: la rejilla completa es pequeña
+        if tabla and any(col not in encoders for col in features if col != 'edad'):
+            print("⚠️ No se generó la tabla: hay columnas numéricas además de la edad.")
+        elif tabla:
+            print("📋 Generando tabla de búsqueda...")
+            edades = df_clean['edad'].astype(int)
+            datos_tabla = generar_tabla(modelo, encoders, features, int(edades.min()), int(edades.max()))
+            guardar_arrays(os.path.join(version_dir, 'tabla_perfil'), datos_tabla)
+            print(f"📋 Tabla: {datos_tabla['tabla'].size:,} combinaciones "
+                  f"(edades {edades.min()}-{edades.max()}).")
+    except Exception:
+        # Una versión incompleta nunca se publica
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    # --- 5. PUBLICACIÓN ---
+    manifiesto = registro.publicar(
+        version_dir,
+        precision=round(float(score), 4),
+        features=features,
+        clases=[str(clase) for clase in modelo.classes_],
+    )
+    print(f"💾 Versión {manifiesto['version']} publicada en /modelos/binarios/ "
+          "(los workers la cargan sin reiniciar).")
 
 if __name__ == "__main__":
-    entrenar()
\ No newline at end of file
+    # python modelos/entrenar.py --tabla  -> además genera la tabla de búsqueda (tabla_perfil/)
+    entrenar(tabla='--tabla' in sys.argv[1:])
\ No newline at end of file
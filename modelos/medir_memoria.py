@@ -0,0 +1,134 @@
+# modelos/medir_memoria.py
+"""
+Memoria por worker del modelo de perfil (solo Linux: lee /proc/<pid>/smaps_rollup).
+
+    python modelos/medir_memoria.py [workers]        -> compara antes / después con N workers simulados
+    python modelos/medir_memoria.py --pid <maestro>  -> mide los workers de un gunicorn en marcha
+
+"Antes": cada worker deserializa su propia copia de modelo_perfil.pkl.
+"Después": el maestro carga el bosque exportado de la versión activa
+(bosque_perfil/, mapeado en solo lectura) y los workers lo heredan al
+hacer fork, como con preload_app en gunicorn.conf.py.
+
+RSS cuenta también las páginas compartidas con otros procesos; PSS las
+reparte entre todos los que las comparten, así que la suma de PSS de los
+workers es la RAM que de verdad ocupan.
+"""
+
+import os
+import signal
+import sys
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(base_dir))
+
+WORKERS = 4
+FILAS_DE_PRUEBA = 256
+
+
+def medir(pid):
+    """{'Rss': kB, 'Pss': kB, ...} de un proceso."""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as archivo:
+        for linea in archivo:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                valores[partes[0].rstrip(':')] = int(partes[1])
+    return valores
+
+
+def imprimir(titulo, pids):
+    print(f"\n{titulo}")
+    print(f"{'worker':>10} {'RSS (MB)':>10} {'PSS (MB)':>10}")
+    total_rss = total_pss = 0
+    for pid in pids:
+        memoria = medir(pid)
+        total_rss += memoria['Rss']
+        total_pss += memoria['Pss']
+        print(f"{pid:>10} {memoria['Rss'] / 1024:>10.1f} {memoria['Pss'] / 1024:>10.1f}")
+    print(f"{'total':>10} {total_rss / 1024:>10.1f} {total_pss / 1024:>10.1f}")
+
+
+def simular(titulo, workers, trabajar):
+    """Crea 'workers' procesos con fork; cada uno ejecuta trabajar() y espera a que se le mida."""
+    pids = []
+    for _ in range(workers):
+        lectura, escritura = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(lectura)
+            trabajar()
+            os.write(escritura, b'1')
+            signal.pause()
+            os._exit(0)
+        os.close(escritura)
+        os.read(lectura, 1)  # Esperar a que el worker haya cargado y predicho
+        os.close(lectura)
+        pids.append(pid)
+
+    imprimir(titulo, pids)
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def filas_de_prueba(clases):
+    columnas = {col: valores[0] for col, valores in clases.items()}
+    return [{**columnas, 'edad': 18 + i % 60} for i in range(FILAS_DE_PRUEBA)]
+
+
+def antes(workers):
+    from modelos import registro
+    model_path = os.path.join(registro.directorio_actual(os.path.join(base_dir, 'binarios')), 'modelo_perfil.pkl')
+    if not os.path.exists(model_path):
+        print("\n⚠️ No hay modelo_perfil.pkl: se omite la medición de 'antes'.")
+        return
+
+    def trabajar():
+        import joblib
+        import numpy as np
+        import pandas as pd
+        modelo = joblib.load(model_path)
+        modelo.predict(pd.DataFrame(np.zeros((FILAS_DE_PRUEBA, modelo.n_features_in_)),
+                                    columns=modelo.feature_names_in_))
+
+    simular("Antes: un .pkl deserializado por worker", workers, trabajar)
+
+
+def despues(workers):
+    from modelos.bosque import Bosque
+    from modelos.predecir import AnalistaIA
+    ia = AnalistaIA()
+    if not isinstance(ia.modelo, Bosque):
+        print("\n⚠️ No hay bosque exportado (bosque_perfil/): ejecuta entrenar.py o bosque.py primero.")
+        return
+    filas = filas_de_prueba(ia.clases)
+    simular("Después: bosque mapeado (mmap) y precargado en el maestro", workers,
+            lambda: ia.predecir_lote(filas))
+
+
+def workers_de(maestro):
+    """PIDs cuyo proceso padre es 'maestro' (los workers de gunicorn)."""
+    hijos = []
+    for entrada in os.listdir('/proc'):
+        if entrada.isdigit():
+            try:
+                with open(f'/proc/{entrada}/stat') as archivo:
+                    # El nombre del proceso va entre paréntesis y puede tener espacios
+                    padre = int(archivo.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if padre == maestro:
+                hijos.append(int(entrada))
+    return sorted(hijos)
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    if argumentos[:1] == ['--pid']:
+        maestro = int(argumentos[1])
+        imprimir(f"Workers de gunicorn (maestro {maestro})", workers_de(maestro))
+    else:
+        cantidad = int(argumentos[0]) if argumentos else WORKERS
+        antes(cantidad)
+        despues(cantidad)
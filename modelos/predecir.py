@@ -1,48 +1,246 @@
 # modelos/predecir.py
-import joblib
 import os
-import pandas as pd
+import threading
+import time
 import numpy as np
+from modelos import registro
+from modelos.bosque import Bosque, cargar_arrays
+
+# Columnas que espera el modelo, en el mismo orden que en entrenar.py
+FEATURES = ['edad', 'sexo', 'nacionalidad', 'promedio_ingresos_anuales',
+            'conocimiento_inversionista', 'estado_laboral']
+
+# Cada cuánto se mira si entrenar.py publicó una versión nueva (segundos)
+RECARGA_SEGUNDOS = float(os.getenv('MODELO_RECARGA_SEGUNDOS', '30'))
+
+def _numero(valor):
+    """Edad como número; lo que no se pueda leer cuenta como 0."""
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+class Cerebro:
+    """
+    Un modelo cargado (bosque, clases de los encoders y tabla opcional) de
+    una versión concreta. No cambia una vez creado: al recargar se crea otro
+    y se reemplaza la referencia, así que una predicción en curso termina
+    con el mismo modelo con el que empezó.
+    """
+
+    def __init__(self, modelo, clases, tabla=None, version=None):
+        self.modelo = modelo
+        self.clases = clases  # Clases de cada encoder: {columna: array ordenado}
+        self.tabla = tabla
+        self.version = version
+
+    @classmethod
+    def cargar(cls, directorio, version=None):
+        """
+        Carga el bosque exportado (.npy, solo NumPy) si existe; si no, los
+        archivos .pkl, importando joblib y scikit-learn solo en ese caso.
+        Los arrays se mapean en solo lectura (mmap): los workers de gunicorn
+        comparten las mismas páginas en vez de tener cada uno su copia.
+        Devuelve None si en 'directorio' no hay modelo.
+        """
+        bosque_path = os.path.join(directorio, 'bosque_perfil')
+        model_path = os.path.join(directorio, 'modelo_perfil.pkl')
+        if os.path.isdir(bosque_path):
+            modelo = Bosque.cargar(bosque_path)
+            clases = modelo.encoders
+        elif os.path.exists(model_path):
+            import joblib
+            modelo = joblib.load(model_path, mmap_mode='r')
+            encoders = joblib.load(os.path.join(directorio, 'encoders.pkl'))
+            clases = {col: np.asarray(le.classes_, dtype=str) for col, le in encoders.items()}
+        else:
+            return None
+        # Tabla de búsqueda opcional (python modelos/entrenar.py --tabla)
+        tabla_path = os.path.join(directorio, 'tabla_perfil')
+        tabla = cargar_arrays(tabla_path) if os.path.isdir(tabla_path) else None
+        return cls(modelo, clases, tabla, version)
+
+    def fila_de_prueba(self):
+        """Una entrada válida cualquiera, para calentar el modelo antes de usarlo."""
+        return {'edad': 30, **{col: str(clases[0]) for col, clases in self.clases.items()}}
+
+    def _codificar(self, columnas):
+        """
+        Traduce texto a números columna por columna (sin un transform por valor)
+        y devuelve la matriz de entrada del modelo (float, filas x FEATURES).
+        Las clases de un LabelEncoder vienen ordenadas, así que np.searchsorted
+        da el código de todos los valores a la vez; los que la IA no conoce
+        quedan en 0 (el primero de la lista) para que la app no se rompa.
+        """
+        X = np.zeros((len(columnas['edad']), len(FEATURES)))
+        for i, col in enumerate(FEATURES):
+            if col in self.clases:
+                clases = self.clases[col]
+                valores = np.array([str(v) for v in columnas[col]], dtype=str)
+                pos = np.minimum(np.searchsorted(clases, valores), len(clases) - 1)
+                X[:, i] = np.where(clases[pos] == valores, pos, 0)
+            else:
+                X[:, i] = [_numero(v) for v in columnas[col]]
+        return X
+
+    def _predecir_modelo(self, X):
+        """Predicción del bosque: el exportado recibe el array; el de sklearn, un DataFrame con nombres."""
+        if isinstance(self.modelo, Bosque):
+            return self.modelo.predict(X)
+        import pandas as pd
+        return self.modelo.predict(pd.DataFrame(X, columns=FEATURES))
+
+    def _buscar_en_tabla(self, X):
+        """
+        Perfiles de la tabla precalculada para las filas cuya edad es entera y
+        está dentro del rango de la tabla. Devuelve (perfiles, máscara); las
+        filas fuera de la máscara las resuelve el modelo.
+        """
+        tabla = self.tabla['tabla']
+        edad = X[:, FEATURES.index('edad')]
+        fila_edad = edad - int(self.tabla['edad_min'])
+        en_tabla = (edad == np.floor(edad)) & (fila_edad >= 0) & (fila_edad < tabla.shape[0])
+
+        indices = [fila_edad[en_tabla].astype(np.int64)]
+        indices += [X[en_tabla, FEATURES.index(col)].astype(np.int64) for col in self.tabla['columnas'][1:]]
+        return self.tabla['clases'][tabla[tuple(indices)]], en_tabla
+
+    def predecir(self, datos):
+        """Perfiles de una lista de diccionarios o de un DataFrame (ver AnalistaIA.predecir_lote)."""
+        if hasattr(datos, 'columns'):
+            columnas = {col: datos[col].to_numpy() if col in datos.columns else [None] * len(datos) for col in FEATURES}
+        else:
+            datos = list(datos)
+            columnas = {col: [fila.get(col) for fila in datos] for col in FEATURES}
+        if not len(columnas['edad']):
+            return np.array([], dtype=object)
+
+        X = self._codificar(columnas)
+        if self.tabla is None:
+            return self._predecir_modelo(X)
+
+        # Primero la tabla; el bosque solo para las edades fuera de rango
+        perfiles, en_tabla = self._buscar_en_tabla(X)
+        resultado = np.empty(len(X), dtype=object)
+        resultado[en_tabla] = perfiles
+        if not en_tabla.all():
+            resultado[~en_tabla] = self._predecir_modelo(X[~en_tabla])
+        return resultado
 
 class AnalistaIA:
-    def __init__(self):
+    def __init__(self, binarios_dir=None):
         # Cargar el cerebro al iniciar
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.model_path = os.path.join(base_dir, 'binarios', 'modelo_perfil.pkl')
-        self.encoders_path = os.path.join(base_dir, 'binarios', 'encoders.pkl')
-        
-        self.modelo = None
-        self.encoders = None
+        self.binarios_dir = binarios_dir or os.path.join(base_dir, 'binarios')
+        self.manifest_path = os.path.join(self.binarios_dir, registro.MANIFIESTO)
+
+        self.cerebro = None
+        self._firma = None               # (mtime, tamaño) del manifiesto ya revisado
+        self._proxima_revision = 0.0
+        self._recargando = threading.Lock()
         self._cargar()
 
+    # Atajos a la versión activa
+    @property
+    def modelo(self):
+        return self.cerebro.modelo if self.cerebro else None
+
+    @property
+    def clases(self):
+        return self.cerebro.clases if self.cerebro else None
+
+    @property
+    def tabla(self):
+        return self.cerebro.tabla if self.cerebro else None
+
+    @property
+    def version(self):
+        return self.cerebro.version if self.cerebro else None
+
+    def _firma_manifiesto(self):
+        try:
+            estado = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def _cargar_version(self, manifiesto):
+        """Carga, verifica y calienta la versión de un manifiesto. Lanza excepción si algo falla."""
+        directorio = registro.verificar(self.binarios_dir, manifiesto)
+        cerebro = Cerebro.cargar(directorio, manifiesto['version'])
+        if cerebro is None:
+            raise ValueError(f"La versión {manifiesto['version']} no tiene modelo")
+        # Calentamiento: la primera predicción real no paga la carga de páginas ni de imports
+        cerebro.predecir([cerebro.fila_de_prueba()])
+        return cerebro
+
     def _cargar(self):
-        """Carga los archivos .pkl si existen"""
-        if os.path.exists(self.model_path):
-            self.modelo = joblib.load(self.model_path)
-            self.encoders = joblib.load(self.encoders_path)
-        else:
+        """
+        Carga la versión activa del registro. Si no se puede, la versión
+        anterior más reciente que esté íntegra; sin registro, los archivos
+        sueltos de binarios/.
+        """
+        self._firma = self._firma_manifiesto()
+        self._proxima_revision = time.monotonic() + RECARGA_SEGUNDOS
+        if self._firma:
+            candidatos = [self.binarios_dir]
+            candidatos += [os.path.join(self.binarios_dir, v) for v in reversed(registro.versiones(self.binarios_dir))]
+            for directorio in candidatos:
+                try:
+                    self.cerebro = self._cargar_version(registro.leer_manifiesto(directorio))
+                    return
+                except Exception as e:
+                    print(f"⚠️ ADVERTENCIA: No se pudo cargar el modelo de {directorio}: {e}")
+        self.cerebro = Cerebro.cargar(self.binarios_dir)
+        if self.cerebro is None:
             print("⚠️ ADVERTENCIA: No hay cerebro entrenado. Ejecuta entrenar.py")
 
+    def _recargar(self, firma):
+        """Se ejecuta en un hilo aparte: las predicciones siguen con el modelo anterior mientras tanto."""
+        try:
+            cerebro = self._cargar_version(registro.leer_manifiesto(self.binarios_dir))
+            if cerebro.version != self.version:
+                # Cambio atómico de referencia: las predicciones nuevas ya usan esta versión
+                self.cerebro = cerebro
+                print(f"🔄 Modelo actualizado a la versión {cerebro.version}.")
+        except Exception as e:
+            print(f"⚠️ ADVERTENCIA: No se pudo recargar el modelo, se sigue con el anterior: {e}")
+        finally:
+            self._firma = firma
+            self._recargando.release()
+
+    def _revisar(self):
+        """Cada RECARGA_SEGUNDOS mira si cambió el manifiesto y, si cambió, recarga en segundo plano."""
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        self._proxima_revision = ahora + RECARGA_SEGUNDOS
+        firma = self._firma_manifiesto()
+        if firma is None or firma == self._firma:
+            return
+        if self._recargando.acquire(blocking=False):
+            threading.Thread(target=self._recargar, args=(firma,), daemon=True).start()
+
+    def predecir_lote(self, datos):
+        """
+        Predice el perfil de muchos usuarios con una sola llamada al modelo.
+        'datos' puede ser una lista de diccionarios (como en predecir_perfil)
+        o un DataFrame con las columnas de FEATURES. Devuelve un array con un
+        perfil por fila, en el mismo orden.
+        """
+        self._revisar()
+        cerebro = self.cerebro
+        if cerebro is None:
+            raise RuntimeError("Modelo no cargado. Ejecuta entrenar.py")
+        return cerebro.predecir(datos)
+
     def predecir_perfil(self, datos_usuario):
         """
         Recibe un diccionario con los datos del usuario y devuelve el perfil predicho.
         Ejemplo datos_usuario: {'edad': 25, 'sexo': 'Masculino', ...}
         """
-        if self.modelo is None:
+        if self.cerebro is None:
             return "Desconocido (Modelo no cargado)"
 
-        # 1. Convertir diccionario a DataFrame (como una hoja de excel de 1 fila)
-        df_input = pd.DataFrame([datos_usuario])
-
-        # 2. Traducir texto a números usando los diccionarios guardados (Encoders)
-        for col, le in self.encoders.items():
-            if col in df_input.columns:
-                # Truco de seguridad: Si llega un valor que la IA no conoce, usa el primero de la lista (índice 0)
-                # para evitar que la app se rompa.
-                df_input[col] = df_input[col].apply(lambda x: le.transform([str(x)])[0] if str(x) in le.classes_ else 0)
-
-        # 3. Preguntarle al cerebro
-        prediccion = self.modelo.predict(df_input)
-        
-        # Devolver el resultado (ej. "Agresivo")
-        return prediccion[0]
\ No newline at end of file
+        # Un lote de 1 fila; devolver el resultado (ej. "Agresivo")
+        return self.predecir_lote([datos_usuario])[0]
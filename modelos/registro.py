@@ -0,0 +1,143 @@
+# modelos/registro.py
+"""
+Registro de versiones del modelo de perfil.
+
+Cada entrenamiento publica una versión nueva en su propio directorio:
+
+    binarios/
+      manifest.json            <- versión activa (la que cargan los workers)
+      20260101-120000/         <- fecha UTC (+ -01, -02... si coincide el segundo)
+        manifest.json          <- versión, precisión, features, sha256 de cada archivo
+        modelo_perfil.pkl, encoders.pkl, bosque_perfil/, tabla_perfil/
+
+La publicación es atómica: los archivos se escriben en un directorio
+temporal, que se renombra a su versión con un único os.rename cuando está
+completo, y solo entonces se reemplaza binarios/manifest.json (archivo
+temporal + os.replace). Un worker nunca ve una versión a medio escribir, y
+antes de usarla comprueba los sha256 del manifiesto.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+MANIFIESTO = 'manifest.json'
+
+# Versiones anteriores que se conservan en disco (para volver atrás)
+CONSERVAR_VERSIONES = 5
+
+
+def _sha256(ruta):
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def checksums(directorio):
+    """{ruta relativa: sha256} de todos los archivos de una versión, salvo su manifiesto."""
+    resultado = {}
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            relativa = os.path.relpath(ruta, directorio).replace(os.sep, '/')
+            if relativa != MANIFIESTO:
+                resultado[relativa] = _sha256(ruta)
+    return dict(sorted(resultado.items()))
+
+
+def _escribir_json(ruta, datos):
+    """Escribe a un temporal y lo mueve con os.replace: quien lee ve el archivo viejo o el nuevo, nunca uno a medias."""
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=2)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def preparar(binarios_dir):
+    """
+    Directorio temporal donde entrenar.py escribe los archivos de la versión
+    nueva. Si ya hay una versión (publicada o a medio escribir) con el mismo
+    segundo, se añade un contador (-01, -02...): el nombre sigue ordenando
+    por antigüedad y os.makedirs falla si otro proceso lo creó antes.
+    """
+    marca = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    for intento in range(100):
+        version = f'{marca}-{intento:02d}' if intento else marca
+        temporal = os.path.join(binarios_dir, f'.{version}.tmp')
+        if os.path.exists(os.path.join(binarios_dir, version)):
+            continue
+        try:
+            os.makedirs(temporal)
+        except FileExistsError:
+            continue
+        return temporal
+    raise FileExistsError(f'No hay nombre libre para la versión {marca}')
+
+
+def publicar(temporal, **metadatos):
+    """
+    Cierra la versión escrita en 'temporal': calcula los sha256, escribe su
+    manifiesto, la renombra a binarios/<versión>/ y la activa. Devuelve el manifiesto.
+    """
+    binarios_dir = os.path.dirname(temporal)
+    version = os.path.basename(temporal)[1:-len('.tmp')]
+    manifiesto = {
+        'version': version,
+        'creado': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **metadatos,
+        'archivos': checksums(temporal),
+    }
+    _escribir_json(os.path.join(temporal, MANIFIESTO), manifiesto)
+    os.rename(temporal, os.path.join(binarios_dir, version))
+    _escribir_json(os.path.join(binarios_dir, MANIFIESTO), manifiesto)
+    _podar(binarios_dir, version)
+    return manifiesto
+
+
+def versiones(binarios_dir):
+    """Versiones publicadas en disco, de la más vieja a la más nueva."""
+    return sorted(
+        nombre for nombre in os.listdir(binarios_dir)
+        if not nombre.startswith('.') and os.path.isfile(os.path.join(binarios_dir, nombre, MANIFIESTO))
+    )
+
+
+def _podar(binarios_dir, activa):
+    """Borra las versiones más viejas (los workers que aún las tengan mapeadas no se ven afectados)."""
+    for nombre in versiones(binarios_dir)[:-CONSERVAR_VERSIONES]:
+        if nombre != activa:
+            shutil.rmtree(os.path.join(binarios_dir, nombre), ignore_errors=True)
+
+
+def leer_manifiesto(directorio):
+    """
+    Manifiesto de la versión activa (directorio = binarios/), o de una
+    versión concreta (directorio = binarios/<versión>/). None si no existe.
+    """
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def directorio_actual(binarios_dir):
+    """Directorio con los archivos del modelo activo (binarios/ si aún no hay versiones)."""
+    manifiesto = leer_manifiesto(binarios_dir)
+    return os.path.join(binarios_dir, manifiesto['version']) if manifiesto else binarios_dir
+
+
+def verificar(binarios_dir, manifiesto):
+    """Lanza ValueError si los archivos de la versión no coinciden con los sha256 de su manifiesto."""
+    directorio = os.path.join(binarios_dir, manifiesto['version'])
+    if not os.path.isdir(directorio):
+        raise ValueError(f"No existe la versión {manifiesto['version']}")
+    if checksums(directorio) != manifiesto['archivos']:
+        raise ValueError(f"Los archivos de la versión {manifiesto['version']} no coinciden con su manifiesto")
+    return directorio
@@ -0,0 +1,65 @@
+# /services/batching.py
+
+"""
+Escrituras agrupadas en WriteBatch.
+
+ChunkedBatch tiene la misma interfaz que un batch de Firestore, pero hace
+commit por sí solo cada vez que se alcanza el límite de 500 operaciones.
+Cuando todo cabe en un bloque (el caso normal: alta de usuario, onboarding,
+presupuesto) la escritura es atómica y cuesta un solo viaje de red.
+"""
+
+from firebase_config import db
+
+# Firestore admite hasta 500 operaciones por batch
+BATCH_LIMIT = 500
+
+
+class ChunkedBatch:
+    def __init__(self, limit=BATCH_LIMIT):
+        self.limit = limit
+        self.commits = 0
+        self._batch = db.batch()
+        self._pending = 0
+
+    def _added(self):
+        self._pending += 1
+        if self._pending >= self.limit:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._batch.commit()
+            self.commits += 1
+            self._batch = db.batch()
+            self._pending = 0
+
+    def set(self, ref, data, merge=False):
+        self._batch.set(ref, data, merge=merge)
+        self._added()
+
+    def create(self, ref, data):
+        self._batch.create(ref, data)
+        self._added()
+
+    def update(self, ref, data):
+        self._batch.update(ref, data)
+        self._added()
+
+    def delete(self, ref):
+        self._batch.delete(ref)
+        self._added()
+
+    def commit(self):
+        """Confirma lo pendiente. Devuelve cuántos commits se hicieron en total."""
+        self._flush()
+        return self.commits
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Si hubo un error, descartamos lo pendiente en lugar de escribirlo a medias
+        if exc_type is None:
+            self.commit()
+        return False
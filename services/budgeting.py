@@ -0,0 +1,81 @@
+# /services/budgeting.py
+
+"""
+Presupuesto planeado vs. gasto real por categoría y mes (NumPy).
+
+Las matrices se construyen con una fila por mes y una columna por
+categoría, a partir de los documentos monthly_budgets (planeado) y de los
+rollups (real, ver services/rollups.py). Todo va en unidades menores.
+
+Arrastre tipo "sobres": lo que sobra (o falta) de una categoría en un mes
+pasa al siguiente. Con un único np.cumsum por columna se obtiene el saldo
+acumulado de todos los meses, así que el arrastre de cualquier mes es una
+búsqueda. Solo participan los meses con presupuesto guardado: un mes sin
+planificar no suma ni resta, así que basta con leer esos meses (todos, sin
+límite hacia atrás) para que el saldo no pierda el arrastre más antiguo.
+"""
+
+import numpy as np
+
+
+class BudgetMatrix:
+    """Planeado y real (int64, meses x categorías) para una lista de meses."""
+
+    def __init__(self, months, category_ids, planned, actual, budgeted):
+        self.months = months              # 'YYYY-MM', en orden
+        self.category_ids = category_ids
+        self.planned = planned            # int64 [meses, categorías]
+        self.actual = actual              # int64 [meses, categorías]
+        self.budgeted = budgeted          # bool [meses]: el mes tiene presupuesto guardado
+
+    @property
+    def variance(self):
+        """Planeado - real: positivo si sobró, negativo si se excedió."""
+        return self.planned - self.actual
+
+    def rollover(self):
+        """
+        Arrastre que entra a cada mes por categoría (int64 [meses, categorías]):
+        la suma de (planeado - real) de los meses presupuestados anteriores.
+        """
+        net = np.where(self.budgeted[:, None], self.variance, 0)
+        balance = np.cumsum(net, axis=0)
+        # El arrastre de un mes es el saldo acumulado hasta el mes anterior
+        return np.vstack([np.zeros((1, len(self.category_ids)), dtype=np.int64), balance[:-1]])
+
+
+def report_rows(matrix):
+    """
+    Filas del informe planeado vs. real, una por mes y categoría con
+    presupuesto o gasto: (mes, índice de categoría, planeado, real, diferencia).
+    Los totales se calculan en bloque; aquí solo se recorren las celdas con datos.
+    """
+    variance = matrix.variance
+    months, columns = np.nonzero((matrix.planned != 0) | (matrix.actual != 0))
+    for row, col in zip(months, columns):
+        yield (matrix.months[row], int(col), int(matrix.planned[row, col]),
+               int(matrix.actual[row, col]), int(variance[row, col]))
+
+
+def build_matrix(months, category_ids, budgets, recurring, month_rollups):
+    """
+    months: ['YYYY-MM', ...]; budgets: {month: documento monthly_budgets};
+    recurring / month_rollups: lo que devuelve rollups.read_rollups() (los
+    fijos vigentes en cada mes y los ocasionales de cada mes).
+    """
+    column = {cat_id: index for index, cat_id in enumerate(category_ids)}
+    planned = np.zeros((len(months), len(category_ids)), dtype=np.int64)
+    actual = np.zeros_like(planned)
+
+    for row, month in enumerate(months):
+        for cat_id, plan in budgets.get(month, {}).get('detailed_budget', {}).items():
+            if cat_id in column:
+                planned[row, column[cat_id]] = plan.get('total', 0)
+        # Real = fijos vigentes ese mes + ocasionales del mes
+        for totals in (recurring.get(month, {}), month_rollups.get(month, {})):
+            for cat_id, value in totals.get('expenses_by_category', {}).items():
+                if cat_id in column:
+                    actual[row, column[cat_id]] += value
+
+    budgeted = np.array([month in budgets for month in months], dtype=bool)
+    return BudgetMatrix(list(months), list(category_ids), planned, actual, budgeted)
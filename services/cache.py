@@ -0,0 +1,82 @@
+# /services/cache.py
+
+"""
+Cachés en memoria por worker (cachetools).
+
+Las categorías de un usuario cambian pocas veces al año pero casi todas las
+rutas las leen, así que se guardan por uid en un TTLCache acotado: expulsa
+por LRU cuando se llena y cada entrada caduca tras el TTL.
+
+Con el mismo esquema se cachea la expansión de los ingresos y gastos
+recurrentes a fechas concretas (services/recurrence.py), que solo cambia
+cuando el usuario crea o borra un recurrente.
+
+Cada worker de gunicorn tiene su propia copia. Las escrituras invalidan la
+entrada del worker que las hizo y marcan la hora del cambio en la sesión
+del usuario; los demás workers descartan cualquier entrada anterior a esa
+marca, de modo que el propio usuario nunca ve datos viejos.
+"""
+
+import os
+import threading
+import time
+from cachetools import TTLCache
+
+
+class WorkerCache:
+    def __init__(self, maxsize, ttl):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader, not_before=0):
+        """
+        Devuelve el valor cacheado de 'key' o lo carga con loader().
+        Las entradas cargadas antes del instante 'not_before' se consideran caducadas.
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] >= not_before:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        loaded_at = time.time()
+        value = loader()
+        with self._lock:
+            self._cache[key] = (loaded_at, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def invalidate_prefix(self, first):
+        """Invalida todas las entradas con clave tupla que empieza por 'first' (p. ej. el uid)."""
+        with self._lock:
+            for key in [k for k in self._cache.keys() if isinstance(k, tuple) and k[0] == first]:
+                self._cache.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'maxsize': self._cache.maxsize,
+                'ttl': self._cache.ttl,
+            }
+
+
+# Categorías por uid
+category_cache = WorkerCache(
+    maxsize=int(os.getenv("CATEGORY_CACHE_SIZE", "2048")),
+    ttl=int(os.getenv("CATEGORY_CACHE_TTL", "300")),
+)
+
+# Ocurrencias de recurrentes por (uid, inicio, fin) del horizonte
+recurrence_cache = WorkerCache(
+    maxsize=int(os.getenv("RECURRENCE_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("RECURRENCE_CACHE_TTL", "3600")),
+)
@@ -0,0 +1,35 @@
+# /services/loader.py
+
+"""
+Carga en paralelo de lecturas independientes de Firestore.
+
+Las rutas que necesitan varias colecciones (dashboard, planificador,
+historiales) las piden a la vez a través de un pool de hilos acotado, de
+modo que la latencia se acerca a la de la lectura más lenta en lugar de
+la suma de todas. El cliente de Firestore es seguro entre hilos.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import os
+
+# Un pool por worker, compartido entre peticiones.
+MAX_WORKERS = int(os.getenv("FIRESTORE_LOADER_WORKERS", "8"))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='firestore-loader')
+
+
+def load_parallel(**loaders):
+    """
+    Ejecuta cada función en paralelo y devuelve un objeto con un atributo
+    por nombre. Ejemplo:
+        data = load_parallel(user=repo.get_user, categories=repo.list_categories)
+        data.user, data.categories
+    Si alguna lectura falla, la excepción se propaga al llamador.
+    """
+    if len(loaders) == 1:
+        # Sin nada que paralelizar, evitamos el salto de hilo
+        (name, loader), = loaders.items()
+        return SimpleNamespace(**{name: loader()})
+
+    futures = {name: _executor.submit(loader) for name, loader in loaders.items()}
+    return SimpleNamespace(**{name: future.result() for name, future in futures.items()})
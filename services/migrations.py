@@ -0,0 +1,98 @@
+# /services/migrations.py
+
+"""
+Migraciones de datos sobre documentos existentes en Firestore.
+
+Uso:
+    python -m services.migrations date-keys                # todos los usuarios
+    python -m services.migrations date-keys --user UID     # un usuario
+    python -m services.migrations money [--user UID]       # montos a unidades menores
+"""
+
+import argparse
+from firebase_config import db
+from services import money, rollups
+from services.batching import ChunkedBatch
+from services.transactions import missing_date_fields
+
+
+def backfill_date_fields(user_ref):
+    """
+    Añade 'month', 'day' y 'yyyymm' (y normaliza 'date') en los ingresos y
+    gastos de un usuario (ver services/transactions.py).
+    Al terminar reconstruye sus rollups, ya que puede haber fechas corregidas.
+    Devuelve cuántos documentos se actualizaron.
+    """
+    updated = 0
+    with ChunkedBatch() as batch:
+        for collection in ('income', 'expenses'):
+            for doc in user_ref.collection(collection).select(['date', 'month', 'day', 'yyyymm', 'created_at']).stream():
+                fields = missing_date_fields(doc.to_dict())
+                if fields:
+                    batch.update(doc.reference, fields)
+                    updated += 1
+
+    if updated:
+        rollups.rebuild_user(user_ref)
+    return updated
+
+
+def backfill_minor_units(user_ref):
+    """
+    Pasa a unidades menores (con 'currency') todos los montos antiguos de un
+    usuario. Es lo mismo que hace el repositorio al leer cada documento, pero
+    de una vez. Al terminar reconstruye sus rollups.
+    """
+    user_doc = user_ref.get()
+    currency = (user_doc.to_dict() or {}).get('currency') if user_doc.exists else None
+    currency = currency or money.DEFAULT_CURRENCY
+
+    updated = 0
+    with ChunkedBatch() as batch:
+        for collection in ('income', 'expenses', 'savings', 'savings_goals'):
+            for doc in user_ref.collection(collection).stream():
+                updates = money.legacy_updates(doc.to_dict(), money.MONEY_FIELDS[collection], currency)
+                if updates:
+                    batch.update(doc.reference, updates)
+                    updated += 1
+                if collection == 'savings':
+                    for payment in doc.reference.collection('payments').stream():
+                        updates = money.legacy_updates(payment.to_dict(), money.MONEY_FIELDS['payments'], currency)
+                        if updates:
+                            batch.update(payment.reference, updates)
+                            updated += 1
+
+        for doc in user_ref.collection('monthly_budgets').stream():
+            data = doc.to_dict()
+            if money.is_legacy(data):
+                batch.set(doc.reference, money.budget_to_minor(data, currency))
+                updated += 1
+
+    if updated:
+        rollups.rebuild_user(user_ref)
+    return updated
+
+
+MIGRATIONS = {
+    'date-keys': backfill_date_fields,
+    'month-keys': backfill_date_fields, # Nombre anterior, mismo trabajo
+    'money': backfill_minor_units,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ejecuta una migración de datos.')
+    parser.add_argument('migration', choices=sorted(MIGRATIONS))
+    parser.add_argument('--user', help='UID de un usuario concreto (por defecto: todos)')
+    args = parser.parse_args()
+
+    migrate = MIGRATIONS[args.migration]
+    if args.user:
+        user_refs = [db.collection('users').document(args.user)]
+    else:
+        user_refs = db.collection('users').list_documents()
+
+    total = 0
+    for user_ref in user_refs:
+        total += migrate(user_ref)
+    print(f"✅ Migración '{args.migration}' completada: {total} documentos actualizados.")
@@ -0,0 +1,94 @@
+# /services/money.py
+
+"""
+Montos como enteros en unidades menores (centavos) más un código de moneda.
+
+Los documentos nuevos guardan cada monto como int (p. ej. 'amount': 123450
+para 1,234.50) junto a 'currency'. Los documentos antiguos guardaban floats
+en unidades mayores y no tienen 'currency': así se distinguen, y se
+convierten al leerlos (migración perezosa, ver services/repository.py) o en
+bloque con `python -m services.migrations money`.
+
+Las sumas se hacen siempre sobre enteros, de modo que los totales son exactos.
+Todas las monedas que ofrece el onboarding usan 2 decimales, así que la
+unidad menor es siempre la centésima; 'currency' solo marca el documento.
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Misma moneda por defecto que al crear el usuario
+DEFAULT_CURRENCY = 'USD'
+
+# Decimales de la unidad menor (centavos) en todas las monedas de la app
+MINOR_DIGITS = 2
+
+# Campos con montos de cada tipo de documento
+MONEY_FIELDS = {
+    'income': ('amount',),
+    'expenses': ('amount',),
+    'savings': ('goal_amount', 'saved_amount', 'monthly_commitment', 'goal', 'current'),
+    'payments': ('amount', 'saved_amount_after'),
+    'savings_goals': ('goal', 'current'),
+}
+
+
+def to_minor(value):
+    """'1234.5', 1234.5 -> 123450. Lanza ValueError si no es un número válido."""
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"'{value}' no es un monto válido")
+    if not amount.is_finite():
+        raise ValueError(f"'{value}' no es un monto válido")
+    return int(amount.scaleb(MINOR_DIGITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(value):
+    """123450 -> 1234.5 (solo para mostrar o para formularios)."""
+    return (value or 0) / 10 ** MINOR_DIGITS
+
+
+def is_legacy(data):
+    """Los documentos sin 'currency' guardan floats en unidades mayores."""
+    return 'currency' not in data
+
+
+def amount_minor(data, field='amount'):
+    """Monto de un documento en unidades menores, sea nuevo o antiguo."""
+    value = data.get(field) or 0
+    if is_legacy(data):
+        return to_minor(value)
+    return int(value)
+
+
+def legacy_updates(data, fields, currency):
+    """
+    Campos a reescribir para pasar un documento antiguo a unidades menores
+    (dict vacío si ya está migrado). Solo convierte los campos presentes.
+    """
+    if not is_legacy(data):
+        return {}
+    updates = {field: to_minor(data[field] or 0) for field in fields if field in data}
+    if updates:
+        updates['currency'] = currency
+    return updates
+
+
+def budget_to_minor(data, currency):
+    """Documento monthly_budgets antiguo -> mismo documento con sus partidas en unidades menores."""
+    detailed = {}
+    for cat_id, plan in data.get('detailed_budget', {}).items():
+        items = [{**item, 'amount': to_minor(item.get('amount') or 0)} for item in plan.get('items', [])]
+        total = sum(item['amount'] for item in items) if items else to_minor(plan.get('total') or 0)
+        detailed[cat_id] = {'items': items, 'total': total}
+    return {
+        **data,
+        'detailed_budget': detailed,
+        'total_global': sum(plan['total'] for plan in detailed.values()),
+        'currency': currency,
+    }
+
+
+def format_minor(value):
+    """123450 -> '1,234.50'."""
+    return f"{from_minor(value):,.{MINOR_DIGITS}f}"
@@ -0,0 +1,257 @@
+# /services/projection.py
+
+"""
+Motor de proyección mensual (vectorizado con NumPy).
+
+Regla única para todo el proyecto:
+  - 'mensual'   cuenta su monto cada mes.
+  - 'quincenal' cuenta monto * 26 / 12 cada mes.
+  - 'anual'     cuenta monto / 12 cada mes.
+  - 'ocasional' (y cualquier frecuencia desconocida o ausente) solo cuenta
+    su monto en el mes de su fecha.
+Los recurrentes cuentan a partir del mes de su fecha (o de 'since', ver
+recurring_start), no en los meses anteriores.
+
+Las transacciones se convierten a columnas (monto, código de frecuencia,
+mes como entero YYYYMM, código de categoría) en una sola pasada de Python,
+y los totales se calculan con np.bincount, sin más bucles por fila.
+
+Los montos van en unidades menores (ver services/money.py). El valor mensual
+de cada fila se calcula con enteros (monto * 26 // 12 con redondeo al par, sin
+pasar por un factor float que convierte 123.5 en 123.4999...) y se redondea
+antes de sumar, igual que en el camino incremental de services/rollups.py,
+para que ambos den exactamente lo mismo.
+"""
+
+import numpy as np
+from services.money import amount_minor
+from services.transactions import month_code, month_int, month_key
+
+DEFAULT_FREQUENCY = 'ocasional'
+UNCATEGORIZED = 'sin_categoria'
+
+# Clave de los totales recurrentes (también es el id de su documento de rollup)
+RECURRING = 'recurring'
+
+# El orden define el código numérico de cada frecuencia
+FREQUENCIES = ('ocasional', 'mensual', 'quincenal', 'anual')
+FREQUENCY_CODES = {name: code for code, name in enumerate(FREQUENCIES)}
+OCCASIONAL = FREQUENCY_CODES['ocasional']
+
+# Factor mensual por código de frecuencia, como fracción exacta (numerador / denominador)
+MONTHLY_NUMERATORS = np.array([1, 1, 26, 1], dtype=np.int64)
+MONTHLY_DENOMINATORS = np.array([1, 1, 12, 12], dtype=np.int64)
+
+# Mismos factores por nombre, solo para las frecuencias recurrentes
+RECURRING_FACTORS = {
+    name: (int(MONTHLY_NUMERATORS[code]), int(MONTHLY_DENOMINATORS[code]))
+    for name, code in FREQUENCY_CODES.items() if code != OCCASIONAL
+}
+
+
+class Columns:
+    """Transacciones en formato columnar."""
+
+    def __init__(self, amounts, frequencies, months, starts, categories, category_ids):
+        self.amounts = amounts          # int64, unidades menores
+        self.frequencies = frequencies  # int8, índices de FREQUENCIES
+        self.months = months            # int32, YYYYMM (0 = sin fecha válida)
+        self.starts = starts            # int32, YYYYMM desde el que cuenta un recurrente (0 = siempre)
+        self.categories = categories    # int32, índices de category_ids
+        self.category_ids = category_ids
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def to_columns(rows):
+    """
+    Convierte una lista de dicts de ingresos/gastos en Columns con una sola
+    pasada de Python: cada fila llena todas las columnas a la vez, y los ids
+    de categoría se codifican con un dict en orden de aparición.
+    """
+    amounts, frequencies, months, starts, categories = [], [], [], [], []
+    codes = {}
+    for row in rows:
+        get = row.get
+        amount = get('amount')
+        if not isinstance(amount, int) or 'currency' not in row:
+            amount = amount_minor(row)  # Documentos antiguos (floats) o sin monto
+        month = get('yyyymm')
+        if not isinstance(month, int):
+            month = month_int(row)
+        since = get('since')
+        amounts.append(amount)
+        frequencies.append(FREQUENCY_CODES.get(get('frequency') or DEFAULT_FREQUENCY, OCCASIONAL))
+        months.append(month)
+        starts.append(since if isinstance(since, int) else month)
+        categories.append(codes.setdefault(get('categoryId') or UNCATEGORIZED, len(codes)))
+
+    return Columns(np.array(amounts, dtype=np.int64), np.array(frequencies, dtype=np.int8),
+                   np.array(months, dtype=np.int32), np.array(starts, dtype=np.int32),
+                   np.array(categories, dtype=np.int32), list(codes))
+
+
+def divide_rounded(numerator, denominator):
+    """
+    numerator / denominator redondeado al entero más cercano (empates al par,
+    como round). Sirve para enteros de Python y para arrays int64.
+    """
+    quotient, remainder = np.divmod(numerator, denominator)
+    return quotient + ((2 * remainder > denominator) | ((2 * remainder == denominator) & (quotient % 2 == 1)))
+
+
+def monthly_amounts(columns):
+    """Valor mensual de cada fila, redondeado a unidades menores."""
+    return divide_rounded(columns.amounts * MONTHLY_NUMERATORS[columns.frequencies],
+                          MONTHLY_DENOMINATORS[columns.frequencies]).astype(np.int64)
+
+
+def monthly_effective(columns, month):
+    """
+    Monto que cada fila aporta al mes 'month' (entero YYYYMM): recurrentes
+    normalizados si ya empezaron, ocasionales solo si son de ese mes.
+    """
+    recurring = columns.frequencies != OCCASIONAL
+    active = np.where(recurring, columns.starts <= month, columns.months == month)
+    return np.where(active, monthly_amounts(columns), 0)
+
+
+def totals_by_category(values, columns):
+    """Suma 'values' por categoría -> {category_id: total} (solo categorías con importe)."""
+    sums = np.bincount(columns.categories, weights=values, minlength=len(columns.category_ids))
+    return {cat_id: int(round(total)) for cat_id, total in zip(columns.category_ids, sums) if total}
+
+
+def project_month(rows, month):
+    """
+    Proyección de un mes ('YYYY-MM') para una lista de transacciones.
+    Devuelve {'total', 'by_category', 'effective'} donde 'effective' es el
+    aporte de cada fila en el mismo orden de 'rows'.
+    """
+    columns = to_columns(rows)
+    effective = monthly_effective(columns, month_code(month))
+    return {
+        'total': int(effective.sum()),
+        'by_category': totals_by_category(effective, columns),
+        'effective': effective,
+    }
+
+
+def is_recurring(data):
+    return (data.get('frequency') or DEFAULT_FREQUENCY) in RECURRING_FACTORS
+
+
+def recurring_start(data):
+    """
+    Mes YYYYMM desde el que cuenta un recurrente: 'since' si una edición lo
+    fijó, si no el mes de su fecha (0 = sin fecha válida: cuenta desde siempre).
+    """
+    since = data.get('since')
+    return since if isinstance(since, int) else month_int(data)
+
+
+def rollup_bucket(data):
+    """
+    Indica dónde cae una sola transacción en los rollups y con qué monto
+    (camino incremental de services/rollups.py). Devuelve (recurrente, mes
+    'YYYY-MM', monto mensual en unidades menores): para un recurrente el mes
+    es el de su inicio; para un ocasional, el de su fecha. (False, None, 0)
+    si no cuenta en ningún mes.
+    """
+    amount = amount_minor(data)
+    # Misma regla (y mismo redondeo) que rollup_totals, aplicada a una sola transacción
+    factor = RECURRING_FACTORS.get(data.get('frequency') or DEFAULT_FREQUENCY)
+    if factor is not None:
+        numerator, denominator = factor
+        return True, month_key(recurring_start(data)), int(divide_rounded(amount * numerator, denominator))
+
+    # Los documentos nuevos traen el mes como entero; los antiguos se derivan de 'month' / 'date'
+    code = month_int(data)
+    if not code:
+        return False, None, 0
+    return False, month_key(code), amount
+
+
+def ended_rows(entry):
+    """
+    Un recurrente ya terminado (entrada de 'ended', ver services/rollups.py)
+    como dos filas mensuales: +monto desde 'since' y -monto desde 'until'.
+    """
+    row = {'amount': entry['amount'], 'currency': None, 'frequency': 'mensual',
+           'categoryId': entry.get('categoryId')}
+    return [{**row, 'since': entry['since']}, {**row, 'amount': -entry['amount'], 'since': entry['until']}]
+
+
+def _totals_by_month(months, values, categories, category_ids):
+    """{'YYYY-MM': (total, {category_id: total})} agrupando por (mes, categoría) con un solo bincount."""
+    if not len(months):
+        return {}
+    n_categories = len(category_ids)
+    month_codes, month_index = np.unique(months, return_inverse=True)
+    keys = month_index * n_categories + categories
+    grid = np.bincount(keys, weights=values, minlength=len(month_codes) * n_categories)
+    grid = grid.reshape(len(month_codes), n_categories)
+    return {
+        month_key(int(code)): (int(round(by_cat.sum())),
+                               {cat_id: int(round(v)) for cat_id, v in zip(category_ids, by_cat) if v})
+        for code, by_cat in zip(month_codes, grid)
+    }
+
+
+def rollup_totals(rows, ended=()):
+    """
+    Totales enteros para los rollups (ver services/rollups.py) en una sola
+    pasada. Devuelve (changes, months):
+      - changes: {'YYYY-MM': (total, by_category)} cuánto cambian los
+        recurrentes a partir de cada mes (su inicio y, para los de 'ended',
+        también su fin). '0000-00' agrupa los que no tienen fecha.
+      - months: {'YYYY-MM': (total, by_category)} ocasionales de cada mes;
+        los que no tienen fecha válida no cuentan en ningún mes.
+    """
+    rows = list(rows) + [row for entry in ended for row in ended_rows(entry)]
+    columns = to_columns(rows)
+
+    recurring = columns.frequencies != OCCASIONAL
+    values = monthly_amounts(columns)
+    changes = _totals_by_month(columns.starts[recurring], values[recurring], columns.categories[recurring],
+                               columns.category_ids)
+
+    occasional = ~recurring & (columns.months > 0)
+    months = _totals_by_month(columns.months[occasional], columns.amounts[occasional],
+                              columns.categories[occasional], columns.category_ids)
+    return changes, months
+
+
+def recurring_by_month(changes, month_keys):
+    """
+    Totales recurrentes vigentes en cada mes de 'month_keys' a partir de los
+    cambios guardados ({'YYYY-MM': {'income', 'expenses', 'expenses_by_category'}}):
+    un np.cumsum sobre los cambios ordenados por mes y un np.searchsorted
+    para los meses pedidos. Devuelve {month_key: {'income', 'expenses',
+    'expenses_by_category'}}.
+    """
+    keys = sorted(changes)
+    category_ids = sorted({cat_id for change in changes.values() for cat_id in change.get('expenses_by_category', {})})
+    column = {cat_id: 2 + index for index, cat_id in enumerate(category_ids)}
+
+    # Fila 0: antes de cualquier cambio. Columnas: ingresos, gastos y gastos por categoría
+    grid = np.zeros((len(keys) + 1, 2 + len(category_ids)), dtype=np.int64)
+    for row, key in enumerate(keys, start=1):
+        change = changes[key]
+        grid[row, 0] = change.get('income', 0)
+        grid[row, 1] = change.get('expenses', 0)
+        for cat_id, value in change.get('expenses_by_category', {}).items():
+            grid[row, column[cat_id]] = value
+    balance = np.cumsum(grid, axis=0)
+
+    rows = np.searchsorted(np.array(keys, dtype=str), np.array(month_keys, dtype=str), side='right')
+    return {
+        key: {
+            'income': int(balance[row, 0]),
+            'expenses': int(balance[row, 1]),
+            'expenses_by_category': {cat_id: int(balance[row, col]) for cat_id, col in column.items()
+                                     if balance[row, col]},
+        }
+        for key, row in zip(month_keys, rows)
+    }
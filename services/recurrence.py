@@ -0,0 +1,161 @@
+# /services/recurrence.py
+
+"""
+Expansión de ingresos y gastos recurrentes a fechas concretas (NumPy datetime64).
+
+Cada transacción recurrente es una regla anclada en su 'date':
+  - 'mensual':   el mismo día de cada mes (o el último, si el mes es más corto).
+  - 'quincenal': cada 14 días (26 pagos al año, igual que su factor mensual).
+  - 'anual':     el mismo día y mes de cada año.
+
+expand() genera todas las ocurrencias de todas las reglas dentro de un
+horizonte con operaciones sobre arrays (una rejilla reglas x pasos por
+frecuencia), sin bucles de Python por regla. El resultado alimenta el
+calendario de flujo de caja y las proyecciones a futuro.
+"""
+
+from datetime import date
+import numpy as np
+from services.money import amount_minor
+from services.projection import UNCATEGORIZED
+from services.transactions import parse_date
+
+# Frecuencias que se expanden (las ocasionales ocurren una sola vez, en su fecha)
+RECURRING_FREQUENCIES = ('mensual', 'quincenal', 'anual')
+
+# Horizonte por defecto de las proyecciones
+DEFAULT_HORIZON_MONTHS = 24
+
+BIWEEKLY_DAYS = 14
+
+# Campos que necesita la expansión (lecturas proyectadas)
+RECURRENCE_FIELDS = ['amount', 'currency', 'frequency', 'date', 'day', 'categoryId', 'description', 'source']
+
+# Ordinal de 1970-01-01, origen de datetime64
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class Occurrences:
+    """Ocurrencias ordenadas por fecha, en formato columnar."""
+
+    def __init__(self, dates, amounts, rows, source):
+        self.dates = dates      # datetime64[D]
+        self.amounts = amounts  # int64, unidades menores
+        self.rows = rows        # int64, índice de la regla en 'source'
+        self.source = source    # dicts de las transacciones recurrentes
+
+    def __len__(self):
+        return len(self.dates)
+
+    def monthly_totals(self, start, months):
+        """Total por mes (int64) para 'months' meses a partir del mes de 'start'."""
+        first = np.datetime64(start, 'M')
+        index = (self.dates.astype('datetime64[M]') - first).astype(np.int64)
+        inside = (index >= 0) & (index < months)
+        return np.bincount(index[inside], weights=self.amounts[inside], minlength=months).round().astype(np.int64)
+
+    def to_list(self):
+        """Lista de dicts (fecha 'YYYY-MM-DD', monto y datos de la regla) para plantillas."""
+        return [
+            {
+                'date': str(day),
+                'amount': int(amount),
+                'id': self.source[row].get('id'),
+                'description': self.source[row].get('description') or self.source[row].get('source'),
+                'categoryId': self.source[row].get('categoryId') or UNCATEGORIZED,
+                'frequency': self.source[row].get('frequency'),
+            }
+            for day, amount, row in zip(self.dates, self.amounts, self.rows)
+        ]
+
+
+def _day_ordinal(row):
+    """Ordinal del día de la regla: el campo precalculado 'day' o, en documentos antiguos, su 'date'."""
+    day = row.get('day')
+    if isinstance(day, int):
+        return day
+    parsed = parse_date(row.get('date'))
+    return parsed.toordinal() if parsed else 0
+
+
+def _anchors(rows):
+    """Fecha ancla (datetime64[D]) de cada regla; NaT si no tiene fecha válida."""
+    ordinals = np.fromiter((_day_ordinal(r) for r in rows), dtype=np.int64, count=len(rows))
+    anchors = (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+    anchors[ordinals == 0] = np.datetime64('NaT')
+    return anchors
+
+
+def _days_in_month(months):
+    return ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+
+
+def _every_n_months(anchors, step, start, end):
+    """Rejilla de ocurrencias cada 'step' meses para anclas datetime64[D]."""
+    anchor_months = anchors.astype('datetime64[M]')
+    anchor_day = (anchors - anchor_months.astype('datetime64[D]')).astype(np.int64)  # 0 = día 1
+
+    # Primer paso que puede caer dentro del horizonte y número máximo de pasos
+    first_step = np.maximum(0, (np.datetime64(start, 'M') - anchor_months).astype(np.int64) // step)
+    span = (np.datetime64(end, 'M') - np.datetime64(start, 'M')).astype(np.int64)
+    steps = first_step[:, None] + np.arange(span // step + 2)[None, :]
+
+    months = anchor_months[:, None] + steps * step
+    # Los días 29-31 caen en el último día de los meses más cortos
+    days = np.minimum(anchor_day[:, None], _days_in_month(months) - 1)
+    return months.astype('datetime64[D]') + days
+
+
+def _every_n_days(anchors, step, start, end):
+    """Rejilla de ocurrencias cada 'step' días para anclas datetime64[D]."""
+    first_step = np.maximum(0, -(-(np.datetime64(start) - anchors).astype(np.int64) // step))
+    span = (np.datetime64(end) - np.datetime64(start)).astype(np.int64)
+    steps = first_step[:, None] + np.arange(span // step + 2)[None, :]
+    return anchors[:, None] + steps * step
+
+
+_GRIDS = {
+    'mensual': lambda anchors, start, end: _every_n_months(anchors, 1, start, end),
+    'anual': lambda anchors, start, end: _every_n_months(anchors, 12, start, end),
+    'quincenal': lambda anchors, start, end: _every_n_days(anchors, BIWEEKLY_DAYS, start, end),
+}
+
+
+def expand(rows, start, end):
+    """
+    Ocurrencias de las transacciones recurrentes de 'rows' entre 'start' y
+    'end' (date, ambos incluidos), ordenadas por fecha. Las reglas sin fecha
+    válida y las no recurrentes se ignoran.
+    """
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    anchors = _anchors(rows)
+    amounts = np.fromiter((amount_minor(r) for r in rows), dtype=np.int64, count=len(rows))
+    frequencies = np.array([r.get('frequency') for r in rows], dtype=object)
+
+    all_dates, all_rows = [], []
+    for frequency, grid in _GRIDS.items():
+        selected = np.flatnonzero((frequencies == frequency) & ~np.isnat(anchors))
+        if not len(selected):
+            continue
+        dates = grid(anchors[selected], start, end)
+        # Dentro del horizonte y nunca antes de la fecha ancla de la regla
+        valid = (dates >= start) & (dates <= end) & (dates >= anchors[selected][:, None])
+        rule_index = np.broadcast_to(selected[:, None], dates.shape)
+        all_dates.append(dates[valid])
+        all_rows.append(rule_index[valid])
+
+    if not all_dates:
+        empty = np.array([], dtype=np.int64)
+        return Occurrences(np.array([], dtype='datetime64[D]'), empty, empty, rows)
+
+    dates = np.concatenate(all_dates)
+    rule_rows = np.concatenate(all_rows)
+    order = np.argsort(dates, kind='stable')
+    return Occurrences(dates[order], amounts[rule_rows[order]], rule_rows[order], rows)
+
+
+def horizon(months=DEFAULT_HORIZON_MONTHS, today=None):
+    """(inicio, fin) del horizonte: desde el día 1 del mes actual, 'months' meses completos."""
+    first = np.datetime64(today or date.today(), 'M')
+    end = (first + months).astype('datetime64[D]') - 1
+    return first.astype('datetime64[D]').item(), end.item()
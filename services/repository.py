@@ -0,0 +1,549 @@
+# /services/repository.py
+
+"""
+Capa de acceso a Firestore por usuario.
+
+Todas las rutas leen y escriben a través de get_repo(), que guarda una
+instancia de UserRepository en flask.g. Así cada documento o colección se
+pide a Firestore como máximo una vez por petición, aunque varios
+decoradores o pasos de la ruta lo necesiten.
+
+El repositorio cuenta las llamadas que hace (reads / writes) para poder
+fijar presupuestos de lecturas por ruta. Sus lecturas pueden lanzarse en
+paralelo con services.loader.load_parallel.
+
+Los montos se devuelven siempre en unidades menores (services/money.py): los
+documentos antiguos se convierten al leerlos y se reescriben en el momento.
+"""
+
+import base64
+import binascii
+import json
+import threading
+import time
+from flask import g, session, has_request_context
+from firebase_admin import firestore
+from firebase_config import db
+from services import money, recurrence, rollups
+from services.batching import ChunkedBatch
+from services.cache import category_cache, recurrence_cache
+from services.transactions import current_month, prepare_transaction
+
+# Tamaño de página por defecto para los historiales
+PAGE_SIZE = 25
+
+# Clave de la sesión firmada que recuerda qué usuario ya completó el onboarding.
+# Guarda el uid (no un booleano) para que no sirva a otra cuenta en el mismo navegador.
+ONBOARDING_SESSION_KEY = 'onboarding_complete_uid'
+
+# Momento del último cambio de categorías / recurrentes del usuario (ver services/cache.py)
+CATEGORIES_CHANGED_SESSION_KEY = 'categories_changed_at'
+RECURRING_CHANGED_SESSION_KEY = 'recurring_changed_at'
+
+
+def encode_page_token(date, doc_id):
+    """Cursor opaco para la URL a partir de la fecha y el id del último documento."""
+    raw = json.dumps([date, doc_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token):
+    """Inverso de encode_page_token. Devuelve (date, doc_id) o None si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        date, doc_id = json.loads(raw)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(date, str) or not isinstance(doc_id, str) or '/' in doc_id:
+        return None
+    return date, doc_id
+
+
+class UserRepository:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.ref = db.collection('users').document(user_id)
+        self.reads = 0
+        self.writes = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        # Marcas de la sesión leídas aquí, en el hilo de la petición: las lecturas
+        # en paralelo (load_parallel) corren en hilos sin contexto de Flask
+        context = has_request_context()
+        self._categories_changed_at = session.get(CATEGORIES_CHANGED_SESSION_KEY, 0) if context else 0
+        self._recurring_changed_at = session.get(RECURRING_CHANGED_SESSION_KEY, 0) if context else 0
+
+    # --- UTILIDADES INTERNAS ---
+
+    def _fetch(self, key, loader):
+        """Ejecuta 'loader' solo la primera vez que se pide 'key' en la petición."""
+        if key not in self._cache:
+            self._count_read()
+            self._cache[key] = loader()
+        return self._cache[key]
+
+    # Los contadores se tocan desde los hilos de load_parallel: siempre con el lock
+    def _count_read(self, count=1):
+        with self._lock:
+            self.reads += count
+
+    def _count_write(self, count=1):
+        with self._lock:
+            self.writes += count
+
+    def invalidate(self, *names):
+        """Olvida las entradas cacheadas con esos nombres (incluidas sus variantes con parámetros)."""
+        for key in list(self._cache):
+            name = key[0] if isinstance(key, tuple) else key
+            if name in names:
+                del self._cache[key]
+
+    @staticmethod
+    def _with_id(doc):
+        return {'id': doc.id, **doc.to_dict()}
+
+    def _money_docs(self, docs, fields, persist=True):
+        """
+        Dicts con 'id' de los documentos, con sus montos en unidades menores.
+        Los documentos antiguos se convierten aquí y, si se leyeron completos
+        (persist=True), se reescriben en un batch: migración perezosa.
+        """
+        items, upgrades = [], []
+        for doc in docs:
+            item = self._with_id(doc)
+            if money.is_legacy(item):
+                updates = money.legacy_updates(item, fields, self.currency())
+                item.update(updates)
+                if updates and persist:
+                    upgrades.append((doc.reference, updates))
+            items.append(item)
+
+        if upgrades:
+            with ChunkedBatch() as batch:
+                for ref, updates in upgrades:
+                    batch.update(ref, updates)
+            self._count_write(batch.commits)
+        return items
+
+    @staticmethod
+    def _selected(fields):
+        """Campos de una proyección, incluyendo siempre 'currency' (distingue montos antiguos)."""
+        return list(dict.fromkeys([*fields, 'currency']))
+
+    # --- LECTURAS ---
+
+    def get_user(self):
+        """Datos del documento users/{uid} (dict vacío si no existe)."""
+        def load():
+            doc = self.ref.get()
+            return doc.to_dict() if doc.exists else {}
+        return self._fetch('user', load)
+
+    def currency(self):
+        """Moneda del usuario para los montos nuevos."""
+        return self.get_user().get('currency') or money.DEFAULT_CURRENCY
+
+    def list_categories(self):
+        """
+        Categorías del usuario como lista de dicts con 'id'. Se sirven desde la
+        caché del worker (services/cache.py) y solo van a Firestore al caducar.
+        """
+        if 'categories' not in self._cache:
+            def load():
+                self._count_read()
+                return [self._with_id(doc) for doc in self.ref.collection('categories').stream()]
+
+            cached = category_cache.get_or_load(self.user_id, load, not_before=self._categories_changed_at)
+            # Copias: la lista cacheada la comparten todas las peticiones del worker
+            self._cache['categories'] = [dict(cat) for cat in cached]
+        return self._cache['categories']
+
+    def get_category(self, category_id):
+        """Una categoría por id, o None."""
+        return next((c for c in self.list_categories() if c['id'] == category_id), None)
+
+    def page_transactions(self, collection, page_token=None, page_size=PAGE_SIZE, month=None, category_id=None):
+        """
+        Una página de ingresos o gastos ordenada por fecha (más reciente primero).
+        Devuelve (items, next_page_token); next_page_token es None en la última página.
+        """
+        def load():
+            coll = self.ref.collection(collection)
+            query = coll
+            if category_id:
+                query = query.where('categoryId', '==', category_id)
+            if month:
+                query = query.where('month', '==', month)
+            # El id del documento desempata fechas iguales para que el cursor sea estable
+            query = (query.order_by('date', direction=firestore.Query.DESCENDING)
+                          .order_by(firestore.FieldPath.document_id(), direction=firestore.Query.DESCENDING))
+
+            cursor = decode_page_token(page_token) if page_token else None
+            if cursor:
+                date, doc_id = cursor
+                query = query.start_after([date, coll.document(doc_id)])
+
+            # Pedimos uno más para saber si hay página siguiente sin otra consulta
+            docs = list(query.limit(page_size + 1).stream())
+            items = self._money_docs(docs[:page_size], money.MONEY_FIELDS[collection])
+            next_token = None
+            if len(docs) > page_size:
+                last = items[-1]
+                next_token = encode_page_token(last['date'], last['id'])
+            return items, next_token
+        return self._fetch(('page', collection, page_token, page_size, month, category_id), load)
+
+    def list_income(self, month=None, fields=None):
+        """
+        Ingresos del usuario como lista de dicts con 'id', opcionalmente de un mes.
+        Con 'fields' solo se descargan esos campos.
+        """
+        def load():
+            query = self.ref.collection('income')
+            if month:
+                query = query.where('month', '==', month)
+            if fields:
+                query = query.select(self._selected(fields))
+            return self._money_docs(query.stream(), money.MONEY_FIELDS['income'], persist=not fields)
+        # Si ya tenemos los documentos completos, sirven también para una proyección
+        full_key = ('income', month, None)
+        if fields and full_key in self._cache:
+            return self._cache[full_key]
+        return self._fetch(('income', month, tuple(fields)) if fields else full_key, load)
+
+    # --- AGREGACIONES (solo viaja el número, no los documentos) ---
+
+    def count_documents(self, collection, limit=None):
+        """Número de documentos de una subcolección, con count() de Firestore."""
+        def load():
+            query = self.ref.collection(collection)
+            if limit:
+                query = query.limit(limit)
+            return query.count(alias='total').get()[0][0].value
+        return self._fetch(('count', collection, limit), load)
+
+    def sum_field(self, collection, field):
+        """
+        Suma exacta de un campo de montos en una subcolección. Firestore suma
+        (sum()) los documentos ya migrados, los que tienen 'currency'; si
+        quedan documentos antiguos (floats en unidades mayores), la colección
+        se lee completa, lo que además los migra (ver _money_docs), y se suma
+        aquí sobre enteros. Tras esa primera vez vuelve a viajar solo el número.
+        """
+        def load():
+            query = self.ref.collection(collection)
+            aggregation = query.where('currency', '>', '').count(alias='count').sum(field, alias='total')
+            migrated = {result.alias: result.value for result in aggregation.get()[0]}
+            if migrated['count'] == self.count_documents(collection):
+                return migrated['total'] or 0
+            self._count_read()
+            docs = self._money_docs(query.stream(), money.MONEY_FIELDS[collection])
+            return sum(doc.get(field) or 0 for doc in docs)
+        return self._fetch(('sum', collection, field), load)
+
+    def has_income(self):
+        """True si el usuario tiene al menos un ingreso registrado."""
+        if ('income', None, None) in self._cache:
+            return bool(self._cache[('income', None, None)])
+        return self.count_documents('income', limit=1) > 0
+
+    def get_transaction(self, collection, doc_id):
+        """Un ingreso o gasto por id (dict con 'id'), o None."""
+        def load():
+            doc = self.ref.collection(collection).document(doc_id).get()
+            return self._money_docs([doc], money.MONEY_FIELDS[collection])[0] if doc.exists else None
+        return self._fetch(('transaction', collection, doc_id), load)
+
+    def list_recurring(self, collection):
+        """Ingresos o gastos recurrentes, solo con los campos que usa la expansión."""
+        def load():
+            query = (self.ref.collection(collection)
+                         .where('frequency', 'in', list(recurrence.RECURRING_FREQUENCIES))
+                         .select(self._selected(recurrence.RECURRENCE_FIELDS)))
+            return self._money_docs(query.stream(), money.MONEY_FIELDS[collection], persist=False)
+        return self._fetch(('recurring', collection), load)
+
+    def get_recurring_calendar(self, months=recurrence.DEFAULT_HORIZON_MONTHS):
+        """
+        Ocurrencias concretas de los ingresos y gastos recurrentes en los
+        próximos 'months' meses: {'income': Occurrences, 'expenses': Occurrences}.
+        Se cachean por usuario en el worker hasta que cambia algún recurrente.
+        """
+        start, end = recurrence.horizon(months)
+
+        def load():
+            return {
+                collection: recurrence.expand(self.list_recurring(collection), start, end)
+                for collection in ('income', 'expenses')
+            }
+
+        return recurrence_cache.get_or_load((self.user_id, start, end), load,
+                                            not_before=self._recurring_changed_at)
+
+    def get_month_summary(self, month_key):
+        """Totales del mes desde los rollups (ver services/rollups.py)."""
+        return self._fetch(('summary', month_key), lambda: rollups.read_month_summary(self.ref, month_key))
+
+    def get_month_series(self, month_keys):
+        """Series mensuales (ingresos, gastos, gastos por categoría) desde los rollups."""
+        return self._fetch(('series', tuple(month_keys)),
+                           lambda: rollups.read_month_series(self.ref, list(month_keys)))
+
+    def get_month_rollups(self, month_keys):
+        """
+        Rollups de varios meses (un get_all): (recurring, {month_key: dict}),
+        con recurring = {month_key: fijos vigentes en ese mes}.
+        """
+        return self._fetch(('rollups', tuple(month_keys)), lambda: rollups.read_rollups(self.ref, list(month_keys)))
+
+    def list_monthly_budgets(self):
+        """
+        Todos los presupuestos guardados (una consulta): {month_key: documento}.
+        El planificador y el informe necesitan todos los meses presupuestados
+        (el arrastre recorre cada uno), que no se conocen sin listar la colección.
+        """
+        return self._fetch('monthly_budgets', lambda: self._budget_docs(self.ref.collection('monthly_budgets').stream()))
+
+    def _budget_docs(self, docs):
+        """{id: datos} de los presupuestos existentes, migrando los antiguos a unidades menores."""
+        budgets, upgrades = {}, []
+        for doc in docs:
+            if not doc.exists:
+                continue
+            data = doc.to_dict()
+            if money.is_legacy(data):
+                # Migración perezosa de un presupuesto guardado con floats
+                data = money.budget_to_minor(data, self.currency())
+                upgrades.append((doc.reference, data))
+            budgets[doc.id] = data
+
+        if upgrades:
+            with ChunkedBatch() as batch:
+                for ref, data in upgrades:
+                    batch.set(ref, data)
+            self._count_write(batch.commits)
+        return budgets
+
+    def get_emergency_fund(self):
+        def load():
+            doc = self.ref.collection('savings').document('emergency_fund').get()
+            if not doc.exists:
+                return {'goal': 0, 'current': 0}
+            return self._money_docs([doc], money.MONEY_FIELDS['savings'])[0]
+        return self._fetch('emergency_fund', load)
+
+    def list_savings(self):
+        return self._fetch('savings', lambda: self._money_docs(
+            self.ref.collection('savings').stream(), money.MONEY_FIELDS['savings']))
+
+    def list_savings_goals(self):
+        return self._fetch('savings_goals', lambda: self._money_docs(
+            self.ref.collection('savings_goals').stream(), money.MONEY_FIELDS['savings_goals']))
+
+    # --- ESCRITURAS ---
+
+    def create_user(self, email):
+        """
+        Crea el documento del usuario con sus categorías y fondo de emergencia
+        iniciales, todo en un único commit atómico.
+        """
+        categories_ref = self.ref.collection('categories')
+        with ChunkedBatch() as batch:
+            # Añadimos el campo 'currency' al crear el usuario.
+            batch.set(self.ref, {
+                'email': email, 
+                'created_at': firestore.SERVER_TIMESTAMP, 
+                'onboarding_complete': False,
+                'currency': 'USD' # Usamos USD como un valor por defecto seguro.
+            })
+            batch.set(categories_ref.document(), {'name': 'Necesidades', 'budget_percent': 50, 'color': '#3b82f6'})
+            batch.set(categories_ref.document(), {'name': 'Deseos', 'budget_percent': 30, 'color': '#8b5cf6'})
+            batch.set(categories_ref.document(), {'name': 'Ahorro e Inversión', 'budget_percent': 20, 'color': '#10b981'})
+            batch.set(self.ref.collection('savings').document('emergency_fund'),
+                      {'goal': 0, 'current': 0, 'currency': 'USD'})
+        self._count_write(batch.commits)
+        self.invalidate('user', 'categories', 'emergency_fund')
+        self._categories_changed()
+
+    def update_user(self, fields):
+        self._count_write()
+        self.ref.update(fields)
+        self.invalidate('user')
+        if 'onboarding_complete' in fields:
+            self.remember_onboarding(fields['onboarding_complete'])
+
+    def is_onboarding_complete(self):
+        """
+        Estado del onboarding. Una vez completo se recuerda en la sesión firmada,
+        así que las peticiones siguientes no leen users/{uid} para comprobarlo.
+        """
+        if session.get(ONBOARDING_SESSION_KEY) == self.user_id:
+            return True
+        complete = bool(self.get_user().get('onboarding_complete', False))
+        self.remember_onboarding(complete)
+        return complete
+
+    def remember_onboarding(self, complete):
+        if complete:
+            session[ONBOARDING_SESSION_KEY] = self.user_id
+        else:
+            session.pop(ONBOARDING_SESSION_KEY, None)
+
+    def add_transaction(self, collection, data):
+        """Registra un ingreso o gasto (con sus campos derivados) manteniendo los rollups."""
+        self._count_write()
+        doc_ref = rollups.record_transaction(self.ref, collection, prepare_transaction(data))
+        self.invalidate(collection, 'summary', 'series', 'rollups', 'page', 'count', 'sum')
+        if data.get('frequency') in recurrence.RECURRING_FREQUENCIES:
+            self._recurring_changed()
+        return doc_ref
+
+    def delete_transaction(self, collection, doc_id):
+        """Borra un ingreso o gasto descontándolo de los rollups (en una transacción)."""
+        self._count_read()
+        self._count_write()
+        deleted = rollups.delete_transaction(self.ref, collection, doc_id)
+        self.invalidate(collection, 'transaction', 'summary', 'series', 'rollups', 'page', 'count', 'sum')
+        if deleted and deleted.get('frequency') in recurrence.RECURRING_FREQUENCIES:
+            self._recurring_changed()
+        return deleted
+
+    def update_transaction(self, collection, doc_id, fields):
+        """
+        Edita un ingreso o gasto aplicando a los rollups la diferencia entre el
+        valor anterior y el nuevo (en una transacción). Devuelve el documento
+        nuevo, o None si no existía.
+        """
+        self._count_read()
+        self._count_write()
+        old, new = rollups.update_transaction(self.ref, collection, doc_id, fields)
+        self.invalidate(collection, 'transaction', 'summary', 'series', 'rollups', 'page', 'count', 'sum')
+        if any((data or {}).get('frequency') in recurrence.RECURRING_FREQUENCIES for data in (old, new)):
+            self._recurring_changed()
+        return new
+
+    def replace_income(self, incomes):
+        """
+        Sustituye todos los ingresos del usuario (paso de onboarding). Borrados,
+        altas y rollups viajan en un solo batch (atómico mientras quepa en 500 operaciones).
+        """
+        income_ref = self.ref.collection('income')
+        rollup_delta = rollups.RollupDelta()
+        month = current_month()
+
+        with ChunkedBatch() as batch:
+            for income in self.list_income(fields=rollups.ROLLUP_FIELDS):
+                rollup_delta.end('income', income['id'], income, month)
+                batch.delete(income_ref.document(income['id']))
+
+            for income_data in map(prepare_transaction, incomes):
+                batch.set(income_ref.document(), income_data)
+                rollup_delta.add('income', income_data)
+
+            # Reflejamos el reemplazo de ingresos en los resúmenes mensuales
+            rollup_delta.write(batch, self.ref)
+        self._count_write(batch.commits)
+        self.invalidate('income', 'summary', 'series', 'rollups', 'page', 'count', 'sum')
+        self._recurring_changed()
+
+    def update_category_percents(self, percents):
+        """Actualiza budget_percent de varias categorías. percents: {cat_id: int}."""
+        with ChunkedBatch() as batch: # Usamos batch para guardar todo junto
+            for cat_id, percent in percents.items():
+                batch.update(self.ref.collection('categories').document(cat_id), {'budget_percent': percent})
+        self._count_write(batch.commits)
+        self.invalidate('categories')
+        self._categories_changed()
+
+    def _categories_changed(self):
+        """Invalida la caché de categorías en este worker y, vía sesión, en los demás."""
+        category_cache.invalidate(self.user_id)
+        self._categories_changed_at = time.time()
+        if has_request_context():
+            session[CATEGORIES_CHANGED_SESSION_KEY] = self._categories_changed_at
+
+    def _recurring_changed(self):
+        """Invalida la expansión de recurrentes en este worker y, vía sesión, en los demás."""
+        self.invalidate('recurring')
+        recurrence_cache.invalidate_prefix(self.user_id)
+        self._recurring_changed_at = time.time()
+        if has_request_context():
+            session[RECURRING_CHANGED_SESSION_KEY] = self._recurring_changed_at
+
+    def save_monthly_budget(self, month_key, data):
+        self._count_write()
+        self.ref.collection('monthly_budgets').document(month_key).set(data)
+        self.invalidate('monthly_budgets')
+
+    def complete_onboarding(self, savings_goal=None):
+        """
+        Marca el onboarding como completo y, si se indica, fija la meta de ahorro
+        (en unidades menores).
+        """
+        if savings_goal is not None:
+            # Garantiza que el fondo ya está en unidades menores antes de escribir la meta
+            self.get_emergency_fund()
+        with ChunkedBatch() as batch:
+            if savings_goal is not None:
+                batch.update(self.ref.collection('savings').document('emergency_fund'), {'goal': savings_goal})
+            batch.update(self.ref, {'onboarding_complete': True})
+        self._count_write(batch.commits)
+        self.invalidate('user', 'emergency_fund')
+        self.remember_onboarding(True)
+
+    def add_saving(self, data):
+        self._count_write()
+        self.ref.collection('savings').add(data)
+        self.invalidate('savings', 'count', 'sum')
+
+    def pay_saving(self, saving_id, amount):
+        """
+        Registra un pago (en unidades menores) en una meta de ahorro dentro de
+        una transacción. El saldo se suma con Increment en el servidor,
+        'achieved' se deriva del mismo snapshot y el pago queda anotado en
+        savings/{id}/payments en el mismo commit. Devuelve el estado
+        'achieved', o None si la meta no existe.
+        """
+        saving_ref = self.ref.collection('savings').document(saving_id)
+        payment_ref = saving_ref.collection('payments').document()
+        currency = self.currency()
+
+        @firestore.transactional
+        def pay(transaction):
+            snapshot = saving_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            saving = snapshot.to_dict()
+            # Una meta antigua se migra a unidades menores en la misma transacción
+            legacy = money.legacy_updates(saving, money.MONEY_FIELDS['savings'], currency)
+            saving.update(legacy)
+            new_saved_amount = saving.get('saved_amount', 0) + amount
+            achieved = new_saved_amount >= saving.get('goal_amount', 0)
+
+            transaction.update(saving_ref, {
+                **legacy,
+                'saved_amount': new_saved_amount if legacy else firestore.Increment(amount),
+                'achieved': achieved
+            })
+            transaction.set(payment_ref, {
+                'amount': amount,
+                'saved_amount_after': new_saved_amount,
+                'currency': saving['currency'],
+                'created_at': firestore.SERVER_TIMESTAMP
+            })
+            return achieved
+
+        self._count_read()
+        self._count_write()
+        achieved = pay(db.transaction())
+        self.invalidate('savings', 'saving', 'count', 'sum')
+        return achieved
+
+
+def get_repo():
+    """Repositorio del usuario en sesión, compartido durante toda la petición."""
+    user_id = session.get('user')
+    repo = g.get('repo')
+    if repo is None or repo.user_id != user_id:
+        repo = g.repo = UserRepository(user_id)
+    return repo
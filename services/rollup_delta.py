@@ -0,0 +1,92 @@
+# /services/rollup_delta.py
+
+"""
+Aritmética de los rollups (ver services/rollups.py): cuánto cambia cada
+documento de rollup al crear, borrar o editar transacciones. Sin Firestore,
+para poder probarla sola; services/rollups.py añade la escritura.
+"""
+
+from services.projection import RECURRING, UNCATEGORIZED, is_recurring, recurring_start, rollup_bucket
+from services.transactions import month_int, month_key
+
+
+def _empty_totals():
+    return {'income': 0, 'expenses': 0, 'expenses_by_category': {}}
+
+
+class RollupDelta:
+    """
+    Acumula las variaciones que una o varias transacciones producen en los
+    rollups, para escribirlas con una sola operación por documento.
+    """
+
+    def __init__(self):
+        self._docs = {}      # {'YYYY-MM': totales} de los ocasionales
+        self._changes = {}   # {'YYYY-MM': totales} cambios de los recurrentes
+        self._ended = []     # recurrentes terminados (campo 'ended' del documento recurrente)
+
+    def add(self, collection, data, sign=1):
+        """Suma (sign=1) o resta (sign=-1) una transacción de 'income' o 'expenses'."""
+        recurring, key, amount = rollup_bucket(data)
+        if key is None or not amount:
+            return
+        self.add_totals(collection, recurring, key, amount, {data.get('categoryId') or UNCATEGORIZED: amount}, sign)
+
+    def add_totals(self, collection, recurring, key, total, by_category, sign=1):
+        """Suma totales ya agregados (total y desglose por categoría) a un mes de los recurrentes o de los ocasionales."""
+        totals = (self._changes if recurring else self._docs).setdefault(key, _empty_totals())
+        totals[collection] += sign * total
+        if collection == 'expenses':
+            by_cat = totals['expenses_by_category']
+            for cat_id, value in by_category.items():
+                by_cat[cat_id] = by_cat.get(cat_id, 0) + sign * value
+
+    def end(self, collection, doc_id, data, month):
+        """
+        Retira una transacción (al borrarla o editarla). Un recurrente deja de
+        contar desde 'month' (YYYYMM, el mes en curso) o desde su inicio si aún
+        no empezó; si ya contaba en meses anteriores, queda anotado en 'ended'.
+        """
+        if not is_recurring(data):
+            self.add(collection, data, sign=-1)
+            return
+        _, _, amount = rollup_bucket(data)
+        if not amount:
+            return
+        category_id = data.get('categoryId') or UNCATEGORIZED
+        start = recurring_start(data)
+        until = max(start, month)
+        self.add_totals(collection, True, month_key(until), amount, {category_id: amount}, sign=-1)
+        if start < until:
+            self._ended.append({'id': doc_id, 'collection': collection, 'amount': amount,
+                                'categoryId': category_id, 'since': start, 'until': until})
+
+    def edit(self, collection, doc_id, old, new, month):
+        """
+        Cambia el aporte de 'old' por el de 'new' y devuelve 'new'. Si el
+        aporte de un recurrente cambia, el valor anterior se queda en los meses
+        ya pasados y el nuevo rige desde 'month': para eso 'new' lleva 'since'.
+        """
+        if is_recurring(old) and is_recurring(new):
+            # Misma categoría, monto mensual e inicio: el historial no cambia (p. ej. solo cambió el texto)
+            unchanged = {**new, 'since': max(month_int(new), old.get('since') or 0)}
+            if (old.get('categoryId') == new.get('categoryId')
+                    and rollup_bucket(old) == rollup_bucket(unchanged)):
+                return new
+
+        # Mes desde el que puede contar el valor nuevo: lo anterior ya lo cubren
+        # el valor viejo o 'ended' (si venía de otra edición)
+        since = old.get('since') or 0
+        if is_recurring(old):
+            floor = month if recurring_start(old) < month else since
+        else:
+            # Un ocasional con 'since' ya fue recurrente: si vuelve a serlo, rige desde ahora
+            floor = max(since, month) if since else 0
+        self.end(collection, doc_id, old, month)
+        if is_recurring(new) or floor:
+            new = {**new, 'since': max(month_int(new), floor) if is_recurring(new) else floor}
+        self.add(collection, new)
+        return new
+
+    def doc_ids(self):
+        return {RECURRING, *self._docs}
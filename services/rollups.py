@@ -0,0 +1,307 @@
+# /services/rollups.py
+
+"""
+Resúmenes mensuales materializados ("rollups") por usuario.
+
+Cada usuario mantiene la subcolección users/{uid}/rollups con:
+  - 'recurring': ingresos y gastos fijos (mensual, quincenal, anual) ya
+    normalizados a su valor mensual, guardados como cambios por mes en
+    'changes': {'YYYY-MM': {'income', 'expenses', 'expenses_by_category'}}.
+    Un recurrente suma su valor en el mes en que empieza y lo resta en el
+    mes en que se borra o se edita; el total vigente en un mes es la suma
+    acumulada de los cambios hasta ese mes (projection.recurring_by_month).
+    Así cada mes pasado conserva los fijos que tenía, no los de hoy.
+    'ended' guarda los recurrentes ya terminados (id, colección, monto
+    mensual, categoría, 'since' y 'until') para que una reconstrucción desde
+    las transacciones existentes no borre su historia.
+  - 'YYYY-MM': ingresos y gastos ocasionales de ese mes.
+
+Todos los totales son enteros en unidades menores (ver services/money.py).
+
+Las rutas que escriben transacciones actualizan estos documentos con
+incrementos atómicos, de modo que el dashboard y el planificador leen dos
+documentos en lugar de recorrer todo el historial. Los borrados y las
+ediciones leen el valor anterior dentro de una transacción y aplican la
+diferencia con signo en el mismo commit: mantener los totales cuesta lo
+mismo sea cual sea el tamaño del historial. Un cambio en un recurrente rige
+desde el mes en curso: los meses anteriores conservan el valor que tenían.
+
+Reconstrucción manual:
+    python -m services.rollups               # todos los usuarios
+    python -m services.rollups --user UID    # un usuario
+"""
+
+import argparse
+from firebase_admin import firestore
+from firebase_config import db
+from services import projection, rollup_delta
+from services.transactions import current_month, prepare_transaction
+
+ROLLUPS_COLLECTION = 'rollups'
+RECURRING_DOC = projection.RECURRING
+
+# Formato de los rollups. Si el documento 'recurring' trae otra versión (o
+# ninguna: los de antes de usar unidades menores) se reconstruyen al leerlos.
+# Versión 3: valores mensuales de quincenal / anual calculados con enteros.
+# Versión 4: recurrentes como cambios por mes ('changes') en vez de un total único.
+ROLLUP_VERSION = 4
+
+# Únicos campos que necesitan los cálculos de rollups (lecturas proyectadas)
+ROLLUP_FIELDS = ['amount', 'currency', 'frequency', 'date', 'month', 'yyyymm', 'since', 'categoryId']
+
+
+class RollupDelta(rollup_delta.RollupDelta):
+    """RollupDelta con la escritura de sus variaciones en Firestore."""
+
+    def write(self, writer, user_ref):
+        """Añade los incrementos a un batch o transacción (no hace commit)."""
+        rollups_ref = user_ref.collection(ROLLUPS_COLLECTION)
+        for doc_id, totals in self._docs.items():
+            payload = {'month': doc_id, 'updated_at': firestore.SERVER_TIMESTAMP, **self._increments(totals)}
+            writer.set(rollups_ref.document(doc_id), payload, merge=True)
+
+        if self._changes or self._ended:
+            payload = {'updated_at': firestore.SERVER_TIMESTAMP}
+            changes = {key: self._increments(totals) for key, totals in self._changes.items()}
+            if any(changes.values()):
+                payload['changes'] = {key: increments for key, increments in changes.items() if increments}
+            if self._ended:
+                payload['ended'] = firestore.ArrayUnion(self._ended)
+            writer.set(rollups_ref.document(RECURRING_DOC), payload, merge=True)
+
+    @staticmethod
+    def _increments(totals):
+        """Campos de unos totales como firestore.Increment (solo los que cambian)."""
+        payload = {field: firestore.Increment(totals[field]) for field in ('income', 'expenses') if totals[field]}
+        by_category = {cat_id: firestore.Increment(value)
+                       for cat_id, value in totals['expenses_by_category'].items() if value}
+        if by_category:
+            payload['expenses_by_category'] = by_category
+        return payload
+
+    def replace(self, writer, user_ref, ended=()):
+        """Escribe los totales acumulados como valores absolutos (usado al reconstruir)."""
+        rollups_ref = user_ref.collection(ROLLUPS_COLLECTION)
+        writer.set(rollups_ref.document(RECURRING_DOC), {
+            'changes': self._changes,
+            'ended': list(ended),
+            'version': ROLLUP_VERSION,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        })
+        for doc_id, totals in self._docs.items():
+            payload = {**totals, 'month': doc_id, 'version': ROLLUP_VERSION, 'updated_at': firestore.SERVER_TIMESTAMP}
+            writer.set(rollups_ref.document(doc_id), payload)
+
+
+# --- ESCRITURAS DE TRANSACCIONES ---
+
+def record_transaction(user_ref, collection, data):
+    """Crea un ingreso/gasto y actualiza sus rollups en el mismo commit."""
+    doc_ref = user_ref.collection(collection).document()
+    delta = RollupDelta()
+    delta.add(collection, data)
+
+    batch = db.batch()
+    batch.set(doc_ref, data)
+    delta.write(batch, user_ref)
+    batch.commit()
+    return doc_ref
+
+
+def delete_transaction(user_ref, collection, doc_id):
+    """
+    Borra un ingreso/gasto y descuenta su aporte de los rollups, todo en una
+    transacción (dos borrados simultáneos no pueden descontarlo dos veces).
+    Devuelve los datos del documento borrado, o None si no existía.
+    """
+    doc_ref = user_ref.collection(collection).document(doc_id)
+
+    @firestore.transactional
+    def delete(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        delta = RollupDelta()
+        delta.end(collection, doc_id, data, current_month())
+
+        transaction.delete(doc_ref)
+        delta.write(transaction, user_ref)
+        return data
+
+    return delete(db.transaction())
+
+
+def update_transaction(user_ref, collection, doc_id, fields):
+    """
+    Edita un ingreso/gasto: dentro de una transacción lee el valor anterior,
+    descuenta su aporte, suma el del valor nuevo (con sus campos derivados
+    recalculados) y guarda ambos cambios en el mismo commit. Si cambia el
+    aporte de un recurrente, el nuevo valor rige desde el mes en curso.
+    Devuelve (anterior, nuevo), o (None, None) si el documento no existía.
+    """
+    doc_ref = user_ref.collection(collection).document(doc_id)
+
+    @firestore.transactional
+    def update(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None, None
+        old = snapshot.to_dict()
+        delta = RollupDelta()
+        new = delta.edit(collection, doc_id, old, prepare_transaction({**old, **fields}), current_month())
+
+        transaction.set(doc_ref, new)
+        delta.write(transaction, user_ref)
+        return old, new
+
+    return update(db.transaction())
+
+
+# --- LECTURA ---
+
+def _read_docs(user_ref, month_keys):
+    """
+    Lee en un solo viaje (get_all) el rollup recurrente y los de los meses
+    indicados: (recurring, {month_key: dict}); los meses sin movimientos
+    llegan como dict vacío. Si el usuario aún no tiene rollups (o son de
+    una versión anterior), se reconstruyen una única vez, en una transacción
+    (ver rebuild_user).
+    """
+    rollups_ref = user_ref.collection(ROLLUPS_COLLECTION)
+    refs = [rollups_ref.document(RECURRING_DOC)] + [rollups_ref.document(key) for key in month_keys]
+
+    def load():
+        snapshots = {snap.id: snap for snap in db.get_all(refs)}
+        return {doc_id: (snap.to_dict() if snap.exists else None) or {} for doc_id, snap in snapshots.items()}
+
+    docs = load()
+    if docs[RECURRING_DOC].get('version') != ROLLUP_VERSION:
+        rebuild_user(user_ref, force=False)
+        docs = load()
+    return docs[RECURRING_DOC], {key: docs[key] for key in month_keys}
+
+
+def read_rollups(user_ref, month_keys):
+    """
+    Rollups de los meses indicados (un get_all): (recurring, {month_key: dict}),
+    donde recurring es {month_key: totales recurrentes vigentes en ese mes}.
+    """
+    recurring, months = _read_docs(user_ref, month_keys)
+    return projection.recurring_by_month(recurring.get('changes', {}), month_keys), months
+
+
+def read_month_summary(user_ref, month_key):
+    """Devuelve los totales del mes combinando los recurrentes vigentes y los ocasionales del mes."""
+    recurring, months = read_rollups(user_ref, [month_key])
+    recurring, month = recurring[month_key], months[month_key]
+
+    expenses_by_category = dict(recurring['expenses_by_category'])
+    for cat_id, value in month.get('expenses_by_category', {}).items():
+        expenses_by_category[cat_id] = expenses_by_category.get(cat_id, 0) + value
+
+    return {
+        'recurring_income': recurring['income'],
+        'recurring_expenses': recurring['expenses'],
+        'occasional_income': month.get('income', 0),
+        'occasional_expenses': month.get('expenses', 0),
+        'income': recurring['income'] + month.get('income', 0),
+        'expenses': recurring['expenses'] + month.get('expenses', 0),
+        'expenses_by_category': expenses_by_category,
+    }
+
+
+def read_month_series(user_ref, month_keys):
+    """
+    Series mensuales para gráficos a partir de los rollups (sin recorrer
+    transacciones): ingresos, gastos y gastos por categoría de cada mes, en
+    el orden de 'month_keys', con los recurrentes vigentes en cada mes.
+    Incluye 'updated_at', el cambio más reciente entre los rollups leídos
+    (para Last-Modified).
+    """
+    recurring_doc, months = _read_docs(user_ref, month_keys)
+    recurring = projection.recurring_by_month(recurring_doc.get('changes', {}), month_keys)
+
+    incomes, expenses, by_category = [], [], {}
+    for index, key in enumerate(month_keys):
+        month, fixed = months[key], recurring[key]
+        incomes.append(fixed['income'] + month.get('income', 0))
+        expenses.append(fixed['expenses'] + month.get('expenses', 0))
+        for totals in (fixed, month):
+            for cat_id, value in totals.get('expenses_by_category', {}).items():
+                if value:
+                    by_category.setdefault(cat_id, [0] * len(month_keys))[index] += value
+
+    stamps = [doc['updated_at'] for doc in (recurring_doc, *months.values()) if doc.get('updated_at')]
+    return {
+        'months': list(month_keys),
+        'incomes': incomes,
+        'expenses': expenses,
+        'expenses_by_category': by_category,
+        'updated_at': max(stamps) if stamps else None,
+    }
+
+
+# --- RECONSTRUCCIÓN (BACKFILL) ---
+
+def rebuild_user(user_ref, force=True):
+    """
+    Recalcula desde cero todos los rollups de un usuario (en bloque, con
+    NumPy) a partir de sus transacciones y de los recurrentes ya terminados.
+    Todo va en una transacción que lee los rollups y las transacciones antes
+    de escribir: si otro commit (p. ej. el Increment de record_transaction)
+    toca algo de lo leído, Firestore reintenta la reconstrucción en vez de
+    pisarlo con los valores absolutos. Con force=False no escribe nada si los
+    rollups ya tienen la versión actual (otra petición llegó antes).
+    Devuelve cuántos documentos de rollup quedan, o None si no hizo falta.
+    """
+    rollups_ref = user_ref.collection(ROLLUPS_COLLECTION)
+
+    @firestore.transactional
+    def rebuild(transaction):
+        existing = {snap.id: snap.to_dict() or {} for snap in rollups_ref.stream(transaction=transaction)}
+        recurring = existing.get(RECURRING_DOC, {})
+        if not force and recurring.get('version') == ROLLUP_VERSION:
+            return None
+        ended = recurring.get('ended', [])
+
+        delta = RollupDelta()
+        for collection in ('income', 'expenses'):
+            query = user_ref.collection(collection).select(ROLLUP_FIELDS)
+            rows = [doc.to_dict() for doc in query.stream(transaction=transaction)]
+            entries = [entry for entry in ended if entry.get('collection') == collection]
+            changes, months = projection.rollup_totals(rows, entries)
+            for recurring_totals, totals in ((True, changes), (False, months)):
+                for key, (total, by_category) in totals.items():
+                    delta.add_totals(collection, recurring_totals, key, total, by_category)
+
+        delta.replace(transaction, user_ref, ended)
+        # Borramos meses que ya no tienen transacciones
+        for doc_id in existing:
+            if doc_id not in delta.doc_ids():
+                transaction.delete(rollups_ref.document(doc_id))
+        return len(delta.doc_ids())
+
+    return rebuild(db.transaction())
+
+
+def rebuild_all():
+    """Recalcula los rollups de todos los usuarios."""
+    total = 0
+    for user_ref in db.collection('users').list_documents():
+        rebuild_user(user_ref)
+        total += 1
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconstruye los rollups mensuales.')
+    parser.add_argument('--user', help='UID de un usuario concreto (por defecto: todos)')
+    args = parser.parse_args()
+
+    if args.user:
+        docs = rebuild_user(db.collection('users').document(args.user))
+        print(f"✅ Rollups de {args.user} reconstruidos ({docs} documentos).")
+    else:
+        users = rebuild_all()
+        print(f"✅ Rollups reconstruidos para {users} usuarios.")
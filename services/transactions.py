@@ -0,0 +1,110 @@
+# /services/transactions.py
+
+"""
+Campos derivados que se guardan junto a cada ingreso o gasto.
+
+Todas las escrituras de transacciones pasan por prepare_transaction(), de
+modo que los documentos siempre llevan una fecha válida y ordenable
+('date', formato YYYY-MM-DD), la clave de mes indexada ('month', YYYY-MM)
+que usan las consultas por mes y dos enteros precalculados para comparar sin
+parsear cadenas:
+  - 'day': ordinal del día (date.toordinal(), 1 = 0001-01-01).
+  - 'yyyymm': mes como entero, p. ej. 202610.
+"""
+
+from datetime import datetime
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_date(date_str):
+    """Convierte 'YYYY-MM-DD' en datetime, o None si no es válida."""
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str, DATE_FORMAT)
+    except (ValueError, TypeError):
+        return None
+
+
+def date_fields(date_value):
+    """Campos de fecha derivados para un datetime."""
+    return {
+        'date': date_value.strftime(DATE_FORMAT),
+        'month': date_value.strftime('%Y-%m'),
+        'day': date_value.toordinal(),
+        'yyyymm': date_value.year * 100 + date_value.month,
+    }
+
+
+def month_code(value):
+    """'YYYY-MM' o 'YYYY-MM-DD' -> entero YYYYMM (0 si no es válido). Sin strptime."""
+    if not isinstance(value, str) or len(value) < 7 or value[4] != '-':
+        return 0
+    try:
+        year, month = int(value[:4]), int(value[5:7])
+    except ValueError:
+        return 0
+    return year * 100 + month if 1 <= month <= 12 else 0
+
+
+def month_key(code):
+    """Entero YYYYMM -> 'YYYY-MM'."""
+    return f"{code // 100:04d}-{code % 100:02d}"
+
+
+def add_months(code, count):
+    """Mes YYYYMM desplazado 'count' meses (puede ser negativo)."""
+    index = (code // 100) * 12 + code % 100 - 1 + count
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def current_month():
+    """Mes en curso como entero YYYYMM."""
+    today = datetime.now()
+    return today.year * 100 + today.month
+
+
+def month_range(start, end):
+    """Meses YYYYMM de 'start' a 'end', ambos incluidos."""
+    months = []
+    code = start
+    while code <= end:
+        months.append(code)
+        code = add_months(code, 1)
+    return months
+
+
+def month_int(data):
+    """
+    Mes YYYYMM de una transacción: el campo precalculado 'yyyymm' o, en
+    documentos anteriores a él, el derivado de 'month' / 'date'.
+    """
+    value = data.get('yyyymm')
+    if isinstance(value, int):
+        return value
+    return month_code(data.get('month') or data.get('date'))
+
+
+def prepare_transaction(data):
+    """
+    Devuelve una copia de la transacción con sus campos derivados.
+    Si la fecha falta o no es válida, se usa la de hoy.
+    """
+    date_value = parse_date(data.get('date')) or datetime.now()
+    return {**data, **date_fields(date_value)}
+
+
+def missing_date_fields(data):
+    """
+    Campos derivados que le faltan (o tiene mal) a un documento existente.
+    Devuelve un dict vacío si ya está al día. Para documentos sin fecha
+    válida se usa 'created_at' y, si tampoco existe, la fecha de hoy.
+    """
+    date_value = parse_date(data.get('date'))
+    if date_value is None:
+        created_at = data.get('created_at')
+        date_value = created_at if isinstance(created_at, datetime) else datetime.now()
+
+    expected = date_fields(date_value)
+    return {field: value for field, value in expected.items() if data.get(field) != value}
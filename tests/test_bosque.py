@@ -0,0 +1,140 @@
+# /tests/test_bosque.py
+
+"""
+El bosque exportado (modelos/bosque.py), la tabla de búsqueda
+(entrenar.generar_tabla) y Cerebro.predecir frente al RandomForestClassifier
+de scikit-learn del que salen, con datos sintéticos.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from modelos.bosque import Bosque, cargar_arrays, exportar, guardar_arrays
+from modelos.entrenar import generar_tabla
+from modelos.predecir import FEATURES, Cerebro
+
+EDAD_MIN, EDAD_MAX = 18, 70
+
+CATEGORIAS = {
+    'sexo': ['Femenino', 'Masculino'],
+    'nacionalidad': ['Chilena', 'Dominicana', 'Extranjera'],
+    'promedio_ingresos_anuales': ['Alto', 'Bajo', 'Medio'],
+    'conocimiento_inversionista': ['Avanzado', 'Básico', 'Intermedio', 'Nulo'],
+    'estado_laboral': ['Dependiente', 'Desempleado', 'Independiente'],
+}
+
+
+@pytest.fixture(scope='module')
+def entrenado(tmp_path_factory):
+    """Bosque pequeño entrenado como en entrenar.py y exportado a un directorio temporal."""
+    rng = np.random.default_rng(7)
+    filas = 600
+    df = pd.DataFrame({'edad': rng.integers(EDAD_MIN, EDAD_MAX + 1, filas)})
+    for col, valores in CATEGORIAS.items():
+        df[col] = rng.choice(valores, filas)
+    # Perfil con algo de estructura (edad y conocimiento) y ruido
+    puntaje = (df['edad'] < 35).astype(int) + df['conocimiento_inversionista'].isin(['Avanzado', 'Intermedio'])
+    perfiles = np.array(['Conservador', 'Moderado', 'Agresivo'])
+    df['perfil'] = perfiles[np.where(rng.random(filas) < 0.2, rng.integers(0, 3, filas), puntaje)]
+
+    encoders = {}
+    for col in CATEGORIAS:
+        encoders[col] = LabelEncoder()
+        df[col] = encoders[col].fit_transform(df[col])
+    modelo = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0)
+    modelo.fit(df[FEATURES], df['perfil'])
+
+    directorio = tmp_path_factory.mktemp('binarios')
+    exportar(modelo, encoders, FEATURES, str(directorio / 'bosque_perfil'))
+    guardar_arrays(str(directorio / 'tabla_perfil'), generar_tabla(modelo, encoders, FEATURES, EDAD_MIN, EDAD_MAX))
+    return modelo, encoders, directorio
+
+
+def codificar(encoders, filas):
+    """
+    Entrada de sklearn para 'filas' (dicts con texto), codificada como lo
+    hace Cerebro: lo que un encoder no conoce cuenta como 0 (su primera
+    clase) y una edad ilegible, también como 0.
+    """
+    def valor(col, dato):
+        if col in encoders:
+            return encoders[col].transform([dato])[0] if dato in encoders[col].classes_ else 0
+        try:
+            return float(dato)
+        except (TypeError, ValueError):
+            return 0.0
+
+    return pd.DataFrame([{col: valor(col, fila.get(col)) for col in FEATURES} for fila in filas])
+
+
+def filas_aleatorias(cantidad, seed, edades=None):
+    rng = np.random.default_rng(seed)
+    edades = rng.integers(EDAD_MIN, EDAD_MAX + 1, cantidad) if edades is None else edades
+    return [
+        {'edad': edad, **{col: str(rng.choice(valores)) for col, valores in CATEGORIAS.items()}}
+        for edad in edades
+    ]
+
+
+def test_bosque_exportado_igual_que_sklearn(entrenado):
+    modelo, _, directorio = entrenado
+    bosque = Bosque.cargar(str(directorio / 'bosque_perfil'))
+
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame({'edad': rng.uniform(0, 100, 2_000)})
+    for col, valores in CATEGORIAS.items():
+        X[col] = rng.integers(0, len(valores), len(X))
+    X = X[FEATURES]
+
+    np.testing.assert_array_equal(bosque.predict(X.to_numpy()), modelo.predict(X))
+    np.testing.assert_allclose(bosque.predict_proba(X.to_numpy()), modelo.predict_proba(X), rtol=0, atol=1e-12)
+    assert bosque.features == FEATURES
+    assert list(bosque.classes_) == list(modelo.classes_)
+
+
+def test_tabla_igual_que_el_modelo(entrenado):
+    modelo, encoders, directorio = entrenado
+    tabla = cargar_arrays(str(directorio / 'tabla_perfil'))
+
+    # Cada celda de la rejilla es la predicción del bosque para esa combinación
+    forma = tabla['tabla'].shape
+    rejilla = np.indices(forma).reshape(len(forma), -1)
+    X = pd.DataFrame(dict(zip([str(col) for col in tabla['columnas']], rejilla)))
+    X['edad'] += int(tabla['edad_min'])
+    assert forma == (EDAD_MAX - EDAD_MIN + 1,) + tuple(len(v) for v in CATEGORIAS.values())
+    np.testing.assert_array_equal(tabla['clases'][tabla['tabla'].ravel()], modelo.predict(X[FEATURES]))
+
+    # Y Cerebro la consulta con las mismas respuestas que sklearn
+    bosque = Bosque.cargar(str(directorio / 'bosque_perfil'))
+    cerebro = Cerebro(bosque, bosque.encoders, tabla)
+    filas = filas_aleatorias(500, seed=2)
+    np.testing.assert_array_equal(cerebro.predecir(filas), modelo.predict(codificar(encoders, filas)))
+
+
+def test_cerebro_fuera_de_tabla_y_categorias_desconocidas(entrenado):
+    modelo, encoders, directorio = entrenado
+    bosque = Bosque.cargar(str(directorio / 'bosque_perfil'))
+    con_tabla = Cerebro(bosque, bosque.encoders, cargar_arrays(str(directorio / 'tabla_perfil')))
+    sin_tabla = Cerebro(bosque, bosque.encoders)
+    sklearn = Cerebro(modelo, {col: np.asarray(le.classes_, dtype=str) for col, le in encoders.items()})
+
+    # Edades fuera de rango, no enteras o ilegibles, y textos que ningún encoder conoce
+    # (las x.9 se comportan como x+1 en el bosque: truncarlas en la tabla daría la fila de x)
+    edades = [5, 17, 71, 99, 30.5, 44.25, None, 'abc', '40']
+    edades += [edad + 0.9 for edad in range(EDAD_MIN, EDAD_MAX) for _ in range(10)]
+    filas = filas_aleatorias(len(edades), seed=3, edades=edades)
+    filas[0]['sexo'] = 'Otro'
+    filas[4]['nacionalidad'] = 'Marciana'
+    filas[6]['estado_laboral'] = None
+    filas[7] = {'edad': 'abc'}
+
+    prediccion = modelo.predict(codificar(encoders, filas))
+
+    np.testing.assert_array_equal(con_tabla.predecir(filas), prediccion)
+    np.testing.assert_array_equal(sin_tabla.predecir(filas), prediccion)
+    np.testing.assert_array_equal(sklearn.predecir(filas), prediccion)
+    # Un DataFrame da lo mismo que la lista de dicts
+    np.testing.assert_array_equal(con_tabla.predecir(pd.DataFrame(filas)), prediccion)
+    assert len(con_tabla.predecir([])) == 0
@@ -0,0 +1,73 @@
+# /tests/test_budgeting.py
+
+"""Matriz planeado vs. real y arrastre de sobres (services/budgeting.py)."""
+
+import numpy as np
+from services import projection
+from services.budgeting import build_matrix, report_rows
+from services.transactions import month_key, month_range
+
+
+def budget(**totals):
+    return {'detailed_budget': {cat_id: {'items': [], 'total': total} for cat_id, total in totals.items()}}
+
+
+def spent(**totals):
+    return {'expenses_by_category': totals}
+
+
+def test_rollover_carries_every_budgeted_month():
+    # 18 meses presupuestados: sobran 100 cada mes en 'a'; el arrastre no se corta a los 12
+    months = [month_key(code) for code in month_range(202501, 202606)]
+    budgets = {month: budget(a=1_000) for month in months}
+    rollups = {month: spent(a=900) for month in months}
+    matrix = build_matrix(months, ['a'], budgets, {}, rollups)
+
+    assert matrix.rollover()[:, 0].tolist() == [100 * index for index in range(len(months))]
+
+
+def test_months_without_budget_do_not_carry():
+    months = ['2026-01', '2026-02', '2026-03']
+    budgets = {'2026-01': budget(a=1_000), '2026-03': budget(a=1_000)}
+    rollups = {'2026-01': spent(a=400), '2026-02': spent(a=5_000), '2026-03': spent(a=100)}
+    matrix = build_matrix(months, ['a'], budgets, {}, rollups)
+
+    assert matrix.budgeted.tolist() == [True, False, True]
+    assert matrix.rollover()[:, 0].tolist() == [0, 600, 600]
+
+
+def test_actual_uses_the_recurring_totals_of_each_month():
+    months = ['2026-01', '2026-02', '2026-03']
+    recurring = {'2026-01': spent(a=0), '2026-02': spent(a=500), '2026-03': spent(a=700, b=50)}
+    rollups = {'2026-02': spent(a=10), 'otro-mes': spent(a=99)}
+    matrix = build_matrix(months, ['a', 'b'], {}, recurring, rollups)
+
+    assert matrix.actual.tolist() == [[0, 0], [510, 0], [700, 50]]
+    assert matrix.actual.dtype == np.int64
+
+
+def test_report_keeps_the_recurring_history():
+    # Renta fija de 500 hasta marzo, que sube a 700 en abril y se borra en junio
+    stored = {
+        '2026-01': {'expenses': 500, 'expenses_by_category': {'a': 500}},
+        '2026-04': {'expenses': 200, 'expenses_by_category': {'a': 200}},
+        '2026-06': {'expenses': -700, 'expenses_by_category': {'a': -700}},
+    }
+    months = ['2025-12', '2026-02', '2026-05', '2026-07']
+    recurring = projection.recurring_by_month(stored, months)
+    budgets = {month: budget(a=600) for month in months}
+    rollups = {'2026-07': spent(a=50)}
+    matrix = build_matrix(months, ['a'], budgets, recurring, rollups)
+
+    assert list(report_rows(matrix)) == [
+        ('2025-12', 0, 600, 0, 600),
+        ('2026-02', 0, 600, 500, 100),
+        ('2026-05', 0, 600, 700, -100),
+        ('2026-07', 0, 600, 50, 550),
+    ]
+
+
+def test_report_rows_skip_empty_cells():
+    matrix = build_matrix(['2026-01', '2026-02'], ['a', 'b'], {'2026-01': budget(a=100)}, {},
+                          {'2026-02': spent(b=30)})
+    assert list(report_rows(matrix)) == [('2026-01', 0, 100, 0, 100), ('2026-02', 1, 0, 30, -30)]
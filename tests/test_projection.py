@@ -0,0 +1,254 @@
+# /tests/test_projection.py
+
+"""
+Paridad del motor de proyección (services/projection.py) con los bucles por
+fila que tenían las rutas antes de usarlo, y del camino incremental de los
+rollups (rollup_bucket) con la reconstrucción en bloque (rollup_totals).
+Las fechas de prueba no pasan del mes proyectado: los bucles anteriores no
+distinguían recurrentes que aún no empezaron.
+"""
+
+from datetime import datetime
+import numpy as np
+import pytest
+from services import projection
+from services.projection import UNCATEGORIZED
+
+MONTH = '2026-10'
+FREQUENCIES = ['mensual', 'quincenal', 'anual', 'ocasional', None, '', 'semanal']
+DATES = ['2026-10-03', '2026-10-31', '2026-09-30', '2025-10-15', '2026-13-01', 'no es fecha', '', None]
+CATEGORIES = ['cat_a', 'cat_b', None]
+
+
+# --- BUCLES ANTERIORES (copiados de las rutas, sobre montos en unidades menores) ---
+
+def legacy_dashboard(rows, now):
+    """main.dashboard: aporte de cada fila al mes de 'now' (None si no cuenta)."""
+    effective = []
+    for row in rows:
+        freq = row.get('frequency', 'ocasional')
+        amount = float(row.get('amount', 0))
+        value = None
+        if freq == 'mensual':
+            value = amount
+        elif freq == 'quincenal':
+            value = (amount * 26) / 12
+        elif freq == 'anual':
+            value = amount / 12
+        else:  # Ocasional
+            date_str = row.get('date')
+            if date_str:
+                try:
+                    date = datetime.strptime(date_str, '%Y-%m-%d')
+                    if date.month == now.month and date.year == now.year:
+                        value = amount
+                except ValueError:
+                    pass
+        effective.append(value)
+    return effective
+
+
+def legacy_planner_income(rows):
+    """budget.planner: ingresos fijos mensualizados."""
+    total = 0
+    for row in rows:
+        freq = row.get('frequency', 'ocasional')
+        amt = float(row.get('amount', 0))
+        if freq == 'mensual': total += amt
+        elif freq == 'quincenal': total += (amt * 26) / 12
+        elif freq == 'anual': total += amt / 12
+    return total
+
+
+def legacy_income_history(rows):
+    """income.history: valor mensual de cada ingreso (los ocasionales cuentan completos)."""
+    values = []
+    for row in rows:
+        amount = row.get('amount', 0)
+        freq = row.get('frequency', 'mensual')
+        if freq == 'quincenal':
+            values.append((amount * 26) / 12)
+        elif freq == 'anual':
+            values.append(amount / 12)
+        else:
+            values.append(amount)
+    return values
+
+
+# --- DATOS ---
+
+def make_row(amount, frequency, date, category):
+    row = {'amount': amount, 'currency': 'USD', 'categoryId': category}
+    if frequency is not None:
+        row['frequency'] = frequency
+    if date is not None:
+        row['date'] = date
+    return row
+
+
+def random_rows(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        make_row(int(rng.integers(0, 500_000)), FREQUENCIES[rng.integers(len(FREQUENCIES))],
+                 DATES[rng.integers(len(DATES))], CATEGORIES[rng.integers(len(CATEGORIES))])
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture
+def rows():
+    # Todas las combinaciones de frecuencia, fecha y categoría, más filas aleatorias
+    combos = [make_row(100_003 + i, freq, date, cat)
+              for i, (freq, date, cat) in enumerate(
+                  (f, d, c) for f in FREQUENCIES for d in DATES for c in CATEGORIES)]
+    return combos + random_rows(2_000)
+
+
+# --- PARIDAD CON LAS RUTAS ---
+
+def test_project_month_matches_dashboard_loop(rows):
+    result = projection.project_month(rows, MONTH)
+    expected = legacy_dashboard(rows, datetime(2026, 10, 15))
+
+    # Misma fila a fila (redondeada al centavo) y mismas filas que cuentan
+    assert result['effective'].tolist() == [round(v) if v is not None else 0 for v in expected]
+    assert result['total'] == sum(round(v) for v in expected if v is not None)
+
+    by_category = {}
+    for row, value in zip(rows, expected):
+        if value is not None:
+            cat = row.get('categoryId') or UNCATEGORIZED
+            by_category[cat] = by_category.get(cat, 0) + round(value)
+    assert result['by_category'] == {cat: value for cat, value in by_category.items() if value}
+
+
+def test_monthly_amounts_match_income_history_loop(rows):
+    values = projection.monthly_amounts(projection.to_columns(rows))
+    assert values.dtype == np.int64
+    assert values.tolist() == [round(v) for v in legacy_income_history(rows)]
+
+
+def test_recurring_rollup_matches_planner_income(rows):
+    changes, _ = projection.rollup_totals(rows)
+    total = projection.recurring_by_month({key: {'income': value} for key, (value, _) in changes.items()},
+                                          [MONTH])[MONTH]['income']
+    per_row = legacy_dashboard([r for r in rows if r.get('frequency') in projection.RECURRING_FACTORS],
+                               datetime(2026, 10, 15))
+    assert total == sum(round(v) for v in per_row)
+    # El total del bucle anterior (en float) solo difiere por el redondeo de cada fila
+    assert abs(total - legacy_planner_income(rows)) <= 0.5 * len(per_row)
+
+
+def test_monthly_amounts_accept_legacy_float_rows():
+    # Documentos antiguos: floats en unidades mayores y sin 'currency'
+    rows = [{'amount': 1234.5, 'frequency': 'mensual'}, {'amount': '10.01', 'frequency': 'anual'}]
+    assert projection.monthly_amounts(projection.to_columns(rows)).tolist() == [123450, round(1001 / 12)]
+
+
+# --- CASOS LÍMITE ---
+
+@pytest.mark.parametrize('frequency', [None, '', 'semanal', 'Mensual'])
+def test_missing_or_unknown_frequency_is_occasional(frequency):
+    rows = [make_row(5_000, frequency, '2026-10-01', 'cat_a'), make_row(7_000, frequency, '2026-09-01', 'cat_a')]
+    result = projection.project_month(rows, MONTH)
+    assert result['effective'].tolist() == [5_000, 0]
+    assert projection.rollup_totals(rows) == ({}, {
+        '2026-10': (5_000, {'cat_a': 5_000}),
+        '2026-09': (7_000, {'cat_a': 7_000}),
+    })
+
+
+@pytest.mark.parametrize('date', ['2026-13-01', 'no es fecha', '', None, '10/2026'])
+def test_invalid_dates_count_only_when_recurring(date):
+    occasional = make_row(5_000, 'ocasional', date, 'cat_a')
+    monthly = make_row(7_000, 'mensual', date, 'cat_a')
+    result = projection.project_month([occasional, monthly], MONTH)
+    assert result['effective'].tolist() == [0, 7_000]
+    # Un ocasional sin mes válido no cae en ningún rollup; un recurrente sin fecha cuenta desde siempre
+    assert projection.rollup_bucket(occasional) == (False, None, 0)
+    assert projection.rollup_totals([occasional, monthly]) == ({'0000-00': (7_000, {'cat_a': 7_000})}, {})
+
+
+def test_precomputed_month_wins_over_date():
+    row = {'amount': 100, 'currency': 'USD', 'date': '2026-09-30', 'month': '2026-09', 'yyyymm': 202610}
+    assert projection.project_month([row], MONTH)['total'] == 100
+
+
+@pytest.mark.parametrize('frequency, amount, expected', [
+    # 57 * 26 / 12 = 123.5 exacto: con un factor float daba 123.4999... y se redondeaba a 123
+    ('quincenal', 57, 124), ('quincenal', 105, 228), ('quincenal', 3, 6), ('quincenal', 99_999, 216_664),
+    ('anual', 6, 0), ('anual', 18, 2), ('anual', 30, 2), ('anual', 1, 0), ('mensual', 12_345, 12_345),
+])
+def test_recurring_rounding_is_the_same_on_both_paths(frequency, amount, expected):
+    row = make_row(amount, frequency, '2026-10-01', 'cat_a')
+    numerator, denominator = projection.RECURRING_FACTORS[frequency]
+    exact = amount * numerator / denominator
+    vectorized = int(projection.monthly_amounts(projection.to_columns([row]))[0])
+
+    assert vectorized == expected == round(exact)
+    assert projection.rollup_bucket(row) == (True, '2026-10', vectorized)
+    assert projection.rollup_totals([row])[0]['2026-10'][0] == vectorized
+
+
+def test_empty_input():
+    result = projection.project_month([], MONTH)
+    assert result['total'] == 0 and result['by_category'] == {} and len(result['effective']) == 0
+    assert projection.rollup_totals([]) == ({}, {})
+    assert projection.recurring_by_month({}, [MONTH]) == {MONTH: {'income': 0, 'expenses': 0, 'expenses_by_category': {}}}
+
+
+# --- RECURRENTES POR MES ---
+
+def test_recurring_counts_from_its_start_month():
+    rows = [make_row(1_000, 'mensual', '2026-03-15', 'cat_a'), make_row(500, 'ocasional', '2026-03-01', 'cat_a')]
+    assert projection.project_month(rows, '2026-02')['total'] == 0
+    assert projection.project_month(rows, '2026-03')['total'] == 1_500
+    assert projection.project_month(rows, '2026-04')['total'] == 1_000
+
+
+def test_since_overrides_the_date_month():
+    row = {**make_row(1_000, 'mensual', '2025-01-01', 'cat_a'), 'since': 202610}
+    assert projection.recurring_start(row) == 202610
+    assert projection.project_month([row], '2026-09')['total'] == 0
+    assert projection.rollup_bucket(row) == (True, '2026-10', 1_000)
+
+
+def test_recurring_by_month_is_a_running_total():
+    # Un fijo de 1.000 desde marzo, otro de 300 entre enero y abril (ya terminado) y uno sin fecha
+    rows = [make_row(1_000, 'mensual', '2026-03-01', 'cat_a'), make_row(57, 'quincenal', None, 'cat_b')]
+    ended = [{'id': 'x', 'collection': 'expenses', 'amount': 300, 'categoryId': 'cat_a',
+              'since': 202601, 'until': 202604}]
+    changes, months = projection.rollup_totals(rows, ended)
+    assert months == {}
+    assert changes == {
+        '0000-00': (124, {'cat_b': 124}),
+        '2026-01': (300, {'cat_a': 300}),
+        '2026-03': (1_000, {'cat_a': 1_000}),
+        '2026-04': (-300, {'cat_a': -300}),
+    }
+
+    stored = {key: {'expenses': total, 'expenses_by_category': by_cat} for key, (total, by_cat) in changes.items()}
+    by_month = projection.recurring_by_month(stored, ['2025-12', '2026-01', '2026-03', '2026-04', '2030-01'])
+    assert [totals['expenses'] for totals in by_month.values()] == [124, 424, 1_424, 1_124, 1_124]
+    assert by_month['2026-03']['expenses_by_category'] == {'cat_a': 1_300, 'cat_b': 124}
+    assert by_month['2026-04']['expenses_by_category'] == {'cat_a': 1_000, 'cat_b': 124}
+
+
+# --- CAMINO INCREMENTAL VS. RECONSTRUCCIÓN ---
+
+def test_incremental_buckets_match_rollup_totals(rows):
+    incremental = ({}, {})
+    for row in rows:
+        recurring, key, amount = projection.rollup_bucket(row)
+        if key is None or not amount:
+            continue
+        group = incremental[0 if recurring else 1]
+        total, by_category = group.get(key, (0, {}))
+        cat = row.get('categoryId') or UNCATEGORIZED
+        group[key] = (total + amount, {**by_category, cat: by_category.get(cat, 0) + amount})
+
+    rebuilt = projection.rollup_totals(rows)
+    for group, rebuilt_group in zip(incremental, rebuilt):
+        assert set(rebuilt_group) == set(group)
+        for key, (total, by_category) in group.items():
+            assert rebuilt_group[key] == (total, {cat: value for cat, value in by_category.items() if value})
@@ -0,0 +1,176 @@
+# /tests/test_recurrence.py
+
+"""
+Expansión de recurrentes a fechas (services/recurrence.py) frente a bucles
+día a día con datetime: fin de mes (31 de enero -> 28/29 de febrero), años
+bisiestos, pasos quincenales que cruzan el cambio de año, y la caché de
+ocurrencias por (uid, inicio, fin) del horizonte.
+"""
+
+import calendar
+from datetime import date, timedelta
+import pytest
+from services import recurrence
+from services.cache import WorkerCache
+
+
+def rule(frequency, day, amount=100_00, **extra):
+    return {'amount': amount, 'currency': 'USD', 'frequency': frequency, 'date': day, **extra}
+
+
+def dates(occurrences):
+    return [str(day) for day in occurrences.dates]
+
+
+# --- BUCLES DE REFERENCIA ---
+
+def every_n_months(anchor, step, start, end):
+    """Mismo día cada 'step' meses desde 'anchor', con el día recortado al último del mes."""
+    found, index = [], 0
+    while True:
+        months = anchor.year * 12 + anchor.month - 1 + index * step
+        year, month = divmod(months, 12)
+        day = date(year, month + 1, min(anchor.day, calendar.monthrange(year, month + 1)[1]))
+        if day > end:
+            return found
+        if day >= start:
+            found.append(str(day))
+        index += 1
+
+
+def every_n_days(anchor, step, start, end):
+    found, day = [], anchor
+    while day <= end:
+        if day >= start:
+            found.append(str(day))
+        day += timedelta(days=step)
+    return found
+
+
+REFERENCES = {
+    'mensual': lambda anchor, start, end: every_n_months(anchor, 1, start, end),
+    'anual': lambda anchor, start, end: every_n_months(anchor, 12, start, end),
+    'quincenal': lambda anchor, start, end: every_n_days(anchor, recurrence.BIWEEKLY_DAYS, start, end),
+}
+
+
+# --- FIN DE MES Y BISIESTOS ---
+
+def test_month_end_is_clamped_and_restored():
+    found = dates(recurrence.expand([rule('mensual', '2027-01-31')], date(2027, 1, 1), date(2028, 4, 30)))
+
+    assert found[:4] == ['2027-01-31', '2027-02-28', '2027-03-31', '2027-04-30']
+    assert found[-3:] == ['2028-02-29', '2028-03-31', '2028-04-30']   # 2028 es bisiesto
+    assert len(found) == 16
+
+
+def test_day_30_in_february():
+    found = dates(recurrence.expand([rule('mensual', '2023-12-30')], date(2024, 1, 1), date(2025, 3, 31)))
+    assert '2024-02-29' in found and '2025-02-28' in found
+    assert '2025-03-30' in found
+
+
+def test_yearly_on_february_29():
+    found = dates(recurrence.expand([rule('anual', '2024-02-29')], date(2024, 1, 1), date(2028, 12, 31)))
+    assert found == ['2024-02-29', '2025-02-28', '2026-02-28', '2027-02-28', '2028-02-29']
+
+
+def test_century_years():
+    # 2100 no es bisiesto, 2000 sí
+    found = dates(recurrence.expand([rule('mensual', '2099-12-29')], date(2100, 2, 1), date(2100, 2, 28)))
+    assert found == ['2100-02-28']
+    found = dates(recurrence.expand([rule('anual', '1996-02-29')], date(2000, 1, 1), date(2000, 12, 31)))
+    assert found == ['2000-02-29']
+
+
+# --- QUINCENALES ---
+
+def test_biweekly_crosses_the_year():
+    found = dates(recurrence.expand([rule('quincenal', '2025-12-19')], date(2025, 12, 1), date(2026, 12, 31)))
+
+    assert found[:3] == ['2025-12-19', '2026-01-02', '2026-01-16']
+    assert len([day for day in found if day.startswith('2026')]) == 26
+    # El horizonte empieza a mitad de la serie: el primer paso no se pierde ni se repite
+    found = dates(recurrence.expand([rule('quincenal', '2024-12-27')], date(2026, 1, 1), date(2026, 1, 31)))
+    assert found == ['2026-01-09', '2026-01-23']
+
+
+def test_biweekly_monthly_totals():
+    occurrences = recurrence.expand([rule('quincenal', '2025-12-19', amount=1_00)], date(2025, 12, 1), date(2026, 12, 31))
+    totals = occurrences.monthly_totals(date(2025, 12, 1), 13)
+
+    assert totals.tolist() == [1_00, 3_00, 2_00, 2_00, 2_00, 2_00, 2_00, 3_00, 2_00, 2_00, 2_00, 2_00, 2_00]
+    assert totals[1:].sum() == 26 * 1_00
+
+
+@pytest.mark.parametrize('frequency', sorted(REFERENCES))
+def test_matches_day_by_day_loops(frequency):
+    anchors = [date(2023, 1, 31), date(2024, 2, 29), date(2024, 12, 25), date(2025, 8, 31),
+               date(2026, 3, 15), date(2027, 11, 30), date(2027, 12, 31)]
+    windows = [(date(2024, 1, 1), date(2024, 12, 31)), (date(2025, 12, 20), date(2026, 1, 10)),
+               (date(2026, 2, 1), date(2028, 3, 31)), (date(2027, 12, 1), date(2028, 2, 29))]
+    rows = [rule(frequency, str(anchor), id=str(anchor)) for anchor in anchors]
+
+    for start, end in windows:
+        occurrences = recurrence.expand(rows, start, end)
+        for index, anchor in enumerate(anchors):
+            found = [str(day) for day, row in zip(occurrences.dates, occurrences.rows) if row == index]
+            assert found == REFERENCES[frequency](anchor, start, end), (anchor, start, end)
+        assert dates(occurrences) == sorted(dates(occurrences))
+
+
+def test_invalid_and_occasional_rules_are_ignored():
+    rows = [rule('ocasional', '2026-01-10'), rule('mensual', 'no es fecha'), rule('mensual', None),
+            rule('semanal', '2026-01-10'), rule('mensual', '2026-01-10')]
+    occurrences = recurrence.expand(rows, date(2026, 1, 1), date(2026, 2, 28))
+    assert dates(occurrences) == ['2026-01-10', '2026-02-10']
+    assert occurrences.rows.tolist() == [4, 4]
+    assert len(recurrence.expand([], date(2026, 1, 1), date(2026, 2, 28))) == 0
+
+
+def test_horizon_crosses_the_year():
+    assert recurrence.horizon(3, today=date(2026, 11, 15)) == (date(2026, 11, 1), date(2027, 1, 31))
+    assert recurrence.horizon(2, today=date(2027, 12, 31)) == (date(2027, 12, 1), date(2028, 1, 31))
+
+
+# --- CACHÉ POR (uid, inicio, fin) ---
+
+def test_cache_by_user_and_horizon():
+    cache = WorkerCache(maxsize=16, ttl=3600)
+    rows = {'ana': [rule('mensual', '2026-01-31')], 'beto': [rule('anual', '2024-02-29')]}
+    loads = []
+
+    def calendar_for(uid, months, today):
+        start, end = recurrence.horizon(months, today=today)
+
+        def load():
+            loads.append((uid, start, end))
+            return recurrence.expand(rows[uid], start, end)
+
+        return cache.get_or_load((uid, start, end), load)
+
+    first = calendar_for('ana', 3, date(2026, 1, 5))
+    assert calendar_for('ana', 3, date(2026, 1, 20)) is first          # Mismo horizonte: misma entrada
+    assert dates(first) == ['2026-01-31', '2026-02-28', '2026-03-31']
+    calendar_for('ana', 6, date(2026, 1, 5))                            # Otro fin: otra entrada
+    calendar_for('ana', 3, date(2026, 2, 1))                            # Cambio de mes: otro inicio
+    calendar_for('beto', 3, date(2026, 1, 5))
+    assert len(loads) == 4
+
+    # Un recurrente nuevo invalida todos los horizontes del usuario, no los de otros
+    cache.invalidate_prefix('ana')
+    calendar_for('ana', 3, date(2026, 1, 5))
+    calendar_for('ana', 6, date(2026, 1, 5))
+    calendar_for('beto', 3, date(2026, 1, 5))
+    assert [uid for uid, _, _ in loads[4:]] == ['ana', 'ana']
+
+
+def test_cache_entries_older_than_the_session_stamp_reload():
+    cache = WorkerCache(maxsize=16, ttl=3600)
+    key = ('ana', *recurrence.horizon(3, today=date(2026, 1, 5)))
+    cache.get_or_load(key, lambda: 'viejo')
+
+    assert cache.get_or_load(key, lambda: 'nuevo') == 'viejo'
+    # Otro worker marcó en la sesión un cambio posterior a la carga
+    assert cache.get_or_load(key, lambda: 'nuevo', not_before=float('inf')) == 'nuevo'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
@@ -0,0 +1,42 @@
+# /tests/test_registro.py
+
+"""
+Nombres de versión del registro de modelos (modelos/registro.py) cuando
+varios entrenamientos caen en el mismo segundo.
+"""
+
+from datetime import datetime, timezone
+from modelos import registro
+
+
+class SegundoFijo(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def preparar_version(binarios_dir, contenido):
+    temporal = registro.preparar(str(binarios_dir))
+    with open(f'{temporal}/modelo.bin', 'w') as archivo:
+        archivo.write(contenido)
+    return temporal
+
+
+def test_versiones_en_el_mismo_segundo_no_chocan(tmp_path, monkeypatch):
+    monkeypatch.setattr(registro, 'datetime', SegundoFijo)
+
+    # Dos entrenamientos a la vez: el segundo no reutiliza el temporal del primero
+    primero = preparar_version(tmp_path, 'a')
+    segundo = preparar_version(tmp_path, 'b')
+    assert primero != segundo
+
+    registro.publicar(primero)
+    registro.publicar(segundo)
+    # Y uno posterior no choca con las versiones ya publicadas
+    manifiesto = registro.publicar(preparar_version(tmp_path, 'c'))
+
+    assert registro.versiones(str(tmp_path)) == ['20260101-120000', '20260101-120000-01', '20260101-120000-02']
+    assert manifiesto['version'] == '20260101-120000-02'
+    assert registro.leer_manifiesto(str(tmp_path))['version'] == manifiesto['version']
+    for version, contenido in zip(registro.versiones(str(tmp_path)), 'abc'):
+        assert (tmp_path / version / 'modelo.bin').read_text() == contenido
@@ -0,0 +1,188 @@
+# /tests/test_repository.py
+
+"""
+Presupuesto de lecturas y escrituras de las vistas principales: los
+contadores del repositorio (reads / writes) frente a los viajes que de
+verdad llegan a un cliente de Firestore falso.
+"""
+
+import copy
+import pytest
+
+pytest.importorskip('firebase_admin')
+
+from services import repository, rollups
+from services.loader import load_parallel
+from services.transactions import prepare_transaction
+
+MONTH = '2026-10'
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference, self.id, self._data = ref, ref.id, data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeQuery:
+    """Consultas sobre un dict {ruta: datos}; cada stream() es un viaje."""
+
+    OPERATORS = {'==': lambda a, b: a == b, 'in': lambda a, b: a in b}
+
+    def __init__(self, client, path, filters=(), orders=(), limit=None, after=None):
+        self.client, self.path = client, path
+        self.filters, self.orders, self._limit, self._after = list(filters), list(orders), limit, after
+
+    def _with(self, **changes):
+        fields = {'filters': self.filters, 'orders': self.orders, 'limit': self._limit, 'after': self._after}
+        return FakeQuery(self.client, self.path, **{**fields, **changes})
+
+    def where(self, field, op, value):
+        return self._with(filters=self.filters + [(field, op, value)])
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._with(orders=self.orders + [(field, direction == 'DESCENDING')])
+
+    def limit(self, count):
+        return self._with(limit=count)
+
+    def start_after(self, values):
+        return self._with(after=[getattr(value, 'id', value) for value in values])
+
+    def select(self, fields):
+        return self  # La proyección no cambia el número de viajes
+
+    def _key(self, snap, field):
+        return snap.id if field == '__name__' else snap._data.get(field)
+
+    def stream(self, transaction=None):
+        self.client.calls += 1
+        prefix = self.path + '/'
+        snaps = [FakeSnapshot(FakeDocument(self.client, path), copy.deepcopy(data))
+                 for path, data in self.client.store.items()
+                 if path.startswith(prefix) and '/' not in path[len(prefix):]]
+        for field, op, value in self.filters:
+            snaps = [snap for snap in snaps if self.OPERATORS[op](snap._data.get(field), value)]
+        for field, descending in reversed(self.orders):
+            snaps.sort(key=lambda snap: self._key(snap, field), reverse=descending)
+        if self._after is not None:
+            cursor = tuple(self._after)
+            descending = self.orders[0][1]
+            snaps = [snap for snap in snaps
+                     if (tuple(self._key(snap, field) for field, _ in self.orders) < cursor) == descending
+                     and tuple(self._key(snap, field) for field, _ in self.orders) != cursor]
+        return iter(snaps[:self._limit] if self._limit is not None else snaps)
+
+
+class FakeDocument:
+    def __init__(self, client, path):
+        self.client, self.path, self.id = client, path, path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.client, f'{self.path}/{name}')
+
+    def get(self, transaction=None):
+        self.client.calls += 1
+        return FakeSnapshot(self, copy.deepcopy(self.client.store.get(self.path)))
+
+
+class FakeClient:
+    def __init__(self, store):
+        self.store, self.calls = store, 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def get_all(self, refs, transaction=None):
+        self.calls += 1
+        return [FakeSnapshot(ref, copy.deepcopy(self.store.get(ref.path))) for ref in refs]
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id):
+        return FakeDocument(self.client, f'{self.path}/{doc_id}')
+
+
+def expense(amount, date, category_id='comida', frequency='ocasional'):
+    return prepare_transaction({'description': 'gasto', 'amount': amount, 'currency': 'USD',
+                                'categoryId': category_id, 'frequency': frequency, 'date': date})
+
+
+@pytest.fixture
+def client(monkeypatch, request):
+    uid = request.node.name  # Un usuario por prueba: la caché de categorías del worker no se comparte
+    base = f'users/{uid}'
+    store = {
+        base: {'email': 'a@b.c', 'currency': 'USD', 'onboarding_complete': True},
+        f'{base}/categories/comida': {'name': 'Comida', 'budget_percent': 30},
+        f'{base}/categories/casa': {'name': 'Casa', 'budget_percent': 40},
+        f'{base}/rollups/{rollups.RECURRING_DOC}': {'changes': {}, 'ended': [], 'version': rollups.ROLLUP_VERSION},
+        f'{base}/rollups/{MONTH}': {'income': 0, 'expenses': 3_000, 'expenses_by_category': {'comida': 3_000},
+                                     'month': MONTH, 'version': rollups.ROLLUP_VERSION},
+    }
+    for index in range(30):
+        store[f'{base}/expenses/e{index:02d}'] = expense(100, f'2026-10-{index + 1:02d}')
+
+    fake = FakeClient(store)
+    monkeypatch.setattr(repository, 'db', fake)
+    monkeypatch.setattr(rollups, 'db', fake)
+    fake.uid = uid
+    return fake
+
+
+def test_dashboard_reads(client):
+    repo = repository.UserRepository(client.uid)
+    data = load_parallel(user=repo.get_user, summary=lambda: repo.get_month_summary(MONTH),
+                         categories=repo.list_categories)
+
+    assert data.summary['expenses'] == 3_000
+    assert (repo.reads, repo.writes) == (3, 0)
+    assert client.calls == repo.reads
+
+
+def test_history_reads_one_page(client):
+    repo = repository.UserRepository(client.uid)
+    data = load_parallel(page=lambda: repo.page_transactions('expenses', page_size=20),
+                         categories=repo.list_categories, summary=lambda: repo.get_month_summary(MONTH))
+    items, next_page = data.page
+    # Misma consulta otra vez en la petición: sale de la caché, sin viaje
+    repo.page_transactions('expenses', page_size=20)
+
+    assert len(items) == 20 and next_page
+    assert (repo.reads, repo.writes) == (3, 0)
+    assert client.calls == repo.reads
+
+    second = repository.UserRepository(client.uid)
+    items, next_page = second.page_transactions('expenses', next_page, page_size=20)
+    assert len(items) == 10 and next_page is None
+    assert second.reads == 1
+
+
+def test_edit_reads_and_writes(client, monkeypatch):
+    # La edición en sí (transacción de Firestore) se sustituye por una lectura y una escritura
+    def update_transaction(user_ref, collection, doc_id, fields):
+        doc = user_ref.collection(collection).document(doc_id)
+        old = doc.get().to_dict()
+        new = prepare_transaction({**old, **fields})
+        client.calls += 1
+        client.store[doc.path] = new
+        return old, new
+
+    monkeypatch.setattr(rollups, 'update_transaction', update_transaction)
+
+    repo = repository.UserRepository(client.uid)
+    data = load_parallel(expense=lambda: repo.get_transaction('expenses', 'e05'), categories=repo.list_categories)
+    assert data.expense['amount'] == 100
+    assert (repo.reads, repo.writes) == (2, 0)
+
+    repo = repository.UserRepository(client.uid)
+    new = repo.update_transaction('expenses', 'e05', {'amount': 250, 'currency': repo.currency()})
+    assert new['amount'] == 250
+    # Usuario (moneda) + la lectura del valor anterior; una escritura
+    assert (repo.reads, repo.writes) == (2, 1)
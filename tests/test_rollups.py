@@ -0,0 +1,136 @@
+# /tests/test_rollups.py
+
+"""
+Camino incremental de los rollups (RollupDelta: altas, bajas y ediciones
+mes a mes) frente a la reconstrucción desde las transacciones que quedan
+más los recurrentes terminados ('ended').
+"""
+
+import pytest
+from services import projection
+from services.rollup_delta import RollupDelta
+from services.transactions import month_key, month_range, prepare_transaction
+
+MONTHS = [month_key(code) for code in month_range(202501, 202701)]
+
+
+class FakeUser:
+    """Transacciones y rollups de un usuario, con los deltas aplicados como lo haría Firestore."""
+
+    def __init__(self):
+        self.rows = {'income': {}, 'expenses': {}}
+        self.changes, self.months, self.ended = {}, {}, []
+
+    def apply(self, delta):
+        for store, docs in ((self.changes, delta._changes), (self.months, delta._docs)):
+            for key, totals in docs.items():
+                target = store.setdefault(key, {'income': 0, 'expenses': 0, 'expenses_by_category': {}})
+                target['income'] += totals['income']
+                target['expenses'] += totals['expenses']
+                for cat_id, value in totals['expenses_by_category'].items():
+                    by_cat = target['expenses_by_category']
+                    by_cat[cat_id] = by_cat.get(cat_id, 0) + value
+        self.ended += delta._ended
+
+    def add(self, collection, doc_id, data):
+        data = prepare_transaction({'currency': 'USD', **data})
+        delta = RollupDelta()
+        delta.add(collection, data)
+        self.apply(delta)
+        self.rows[collection][doc_id] = data
+
+    def edit(self, collection, doc_id, fields, month):
+        old = self.rows[collection][doc_id]
+        delta = RollupDelta()
+        self.rows[collection][doc_id] = delta.edit(collection, doc_id, old, prepare_transaction({**old, **fields}), month)
+        self.apply(delta)
+
+    def delete(self, collection, doc_id, month):
+        delta = RollupDelta()
+        delta.end(collection, doc_id, self.rows[collection].pop(doc_id), month)
+        self.apply(delta)
+
+    def incremental(self):
+        return projection.recurring_by_month(self.changes, MONTHS), self.months
+
+    def rebuilt(self):
+        changes, months = {}, {}
+        for collection in ('income', 'expenses'):
+            entries = [entry for entry in self.ended if entry['collection'] == collection]
+            collection_changes, collection_months = projection.rollup_totals(self.rows[collection].values(), entries)
+            for store, totals in ((changes, collection_changes), (months, collection_months)):
+                for key, (total, by_category) in totals.items():
+                    target = store.setdefault(key, {'income': 0, 'expenses': 0, 'expenses_by_category': {}})
+                    target[collection] += total
+                    if collection == 'expenses':
+                        target['expenses_by_category'] = by_category
+        return projection.recurring_by_month(changes, MONTHS), months
+
+
+def nonzero(months):
+    return {key: {'income': t['income'], 'expenses': t['expenses'],
+                  'expenses_by_category': {c: v for c, v in t['expenses_by_category'].items() if v}}
+            for key, t in months.items() if t['income'] or t['expenses']}
+
+
+@pytest.fixture
+def user():
+    user = FakeUser()
+    user.add('income', 'sueldo', {'amount': 100_000, 'frequency': 'mensual', 'date': '2025-06-01'})
+    user.add('expenses', 'renta', {'amount': 50_000, 'frequency': 'mensual', 'date': '2026-01-05', 'categoryId': 'a'})
+    user.add('expenses', 'super', {'amount': 7_000, 'frequency': 'ocasional', 'date': '2026-02-10', 'categoryId': 'a'})
+    return user
+
+
+def test_history_keeps_the_recurring_values_of_each_month(user):
+    user.edit('expenses', 'renta', {'amount': 55_000}, month=202603)
+    user.delete('income', 'sueldo', month=202606)
+    recurring, _ = user.incremental()
+
+    assert recurring['2025-05']['income'] == 0
+    assert recurring['2025-06']['income'] == 100_000
+    assert recurring['2026-05']['income'] == 100_000
+    assert recurring['2026-06']['income'] == 0       # Borrado en junio: deja de contar desde junio
+    assert recurring['2025-12']['expenses'] == 0
+    assert recurring['2026-02']['expenses_by_category'] == {'a': 50_000}
+    assert recurring['2026-03']['expenses_by_category'] == {'a': 55_000}  # La edición rige desde su mes
+    assert user.rows['expenses']['renta']['since'] == 202603
+
+
+def test_text_only_edit_does_not_touch_the_history(user):
+    user.edit('expenses', 'renta', {'description': 'Alquiler'}, month=202605)
+    assert user.ended == []
+    assert 'since' not in user.rows['expenses']['renta']
+
+
+def test_future_recurring_deleted_before_it_starts_leaves_no_trace(user):
+    user.add('expenses', 'gym', {'amount': 12_000, 'frequency': 'anual', 'date': '2026-09-01', 'categoryId': 'b'})
+    user.delete('expenses', 'gym', month=202606)
+    assert user.ended == []
+    assert all('b' not in totals['expenses_by_category'] for totals in user.incremental()[0].values())
+
+
+def test_incremental_path_matches_rebuild(user):
+    user.edit('expenses', 'renta', {'amount': 55_000}, month=202603)
+    user.edit('expenses', 'renta', {'description': 'Alquiler'}, month=202603)
+    user.edit('expenses', 'renta', {'amount': 56_000}, month=202603)   # Segunda edición en el mismo mes
+    user.edit('expenses', 'renta', {'categoryId': 'b'}, month=202605)
+    user.delete('income', 'sueldo', month=202606)
+    user.add('expenses', 'gym', {'amount': 12_001, 'frequency': 'anual', 'date': '2026-09-01', 'categoryId': 'b'})
+    user.delete('expenses', 'gym', month=202606)
+    user.add('income', 'extra', {'amount': 3_001, 'frequency': 'quincenal', 'date': '2026-02-01'})
+    user.edit('income', 'extra', {'frequency': 'ocasional'}, month=202607)  # Recurrente -> ocasional
+    user.edit('income', 'extra', {'frequency': 'mensual'}, month=202608)    # Y de vuelta
+    user.edit('expenses', 'super', {'amount': 8_000, 'date': '2026-03-01'}, month=202608)
+    user.delete('expenses', 'super', month=202609)
+
+    recurring, months = user.incremental()
+    rebuilt_recurring, rebuilt_months = user.rebuilt()
+    assert recurring == rebuilt_recurring
+    assert nonzero(months) == nonzero(rebuilt_months)
+
+    # Ningún mes cuenta dos veces el mismo recurrente
+    assert recurring['2026-04']['expenses_by_category'] == {'a': 56_000}
+    assert recurring['2026-05']['expenses_by_category'] == {'b': 56_000}
+    assert recurring['2026-07']['income'] == 0
+    assert recurring['2026-08']['income'] == 3_001